@@ -1,26 +1,117 @@
 from swarm import Swarm, Agent
+from swarm.types import Response, Result
 from dotenv import load_dotenv
 import os
-from tavily import TavilyClient
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functions.yt import search_youtube_videos, get_transcript_from_prompt
 from functions.functions import get_podcast_episodes_by_title, read_and_chunk_podcast, process_audio_file
-from typing import List, Dict, Optional, Dict as PodcastDict
+from typing import List, Dict
+from memory import podcast_memory  # Shared with the podcast tools
+from utils.llm_gateway import gateway_openai_client
+from utils.transcript_store import get_transcript_store, youtube_id
+from utils.web_search import get_web_search
+from utils.metrics import cost_for, current_context, get_metrics, metrics_context, usage_from_response
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Tavily client with API key from .env
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-
 print("Environment variables loaded")
 
-client = Swarm()
+# Send obvious questions straight to a specialist instead of via the manager
+AGENT_ROUTER = os.getenv("AGENT_ROUTER", "1") == "1"
+# Threads for running one turn's tool calls concurrently
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", 8))
+
+class ParallelSwarm(Swarm):
+    """
+    Swarm that runs the independent tool calls of a turn concurrently
+    instead of one after another, and records every hop (each LLM call
+    and each batch of tool calls) with its latency and cost.
+    """
+
+    def __init__(self, client=None):
+        super().__init__(client=client)
+        self._local = threading.local()
+
+    def _record_hop(self, hop):
+        # Only collected inside run_with_hops, which owns the list
+        hops = getattr(self._local, "hops", None)
+        if hops is not None:
+            hops.append(hop)
+
+    def run_with_hops(self, *args, **kwargs):
+        """Swarm.run that also returns the hops of this run"""
+        hops = []
+        self._local.hops = hops
+        try:
+            return super().run(*args, **kwargs), hops
+        finally:
+            self._local.hops = None
+
+    def get_chat_completion(self, agent, history, context_variables, model_override, stream, debug):
+        start = time.perf_counter()
+        completion = super().get_chat_completion(
+            agent, history, context_variables, model_override, stream, debug
+        )
+        latency = time.perf_counter() - start
+        model = model_override or agent.model
+        input_tokens, output_tokens, cached_tokens = usage_from_response("OpenAI", completion)
+        get_metrics().record_hop(agent.name, "llm", latency, model, input_tokens, output_tokens, cached_tokens)
+        self._record_hop({
+            "agent": agent.name,
+            "kind": "llm",
+            "seconds": latency,
+            "tokens": input_tokens + output_tokens,
+            "cost_usd": cost_for(model, input_tokens, output_tokens, cached_tokens),
+        })
+        return completion
+
+    def handle_tool_calls(self, tool_calls, functions, context_variables, debug):
+        start = time.perf_counter()
+        if len(tool_calls) < 2:
+            response = super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+        else:
+            # Tools run in worker threads, keep their LLM calls attributed
+            # to the caller's session
+            context = current_context()
+
+            def run_one(tool_call):
+                with metrics_context(context):
+                    return Swarm.handle_tool_calls(self, [tool_call], functions, context_variables, debug)
+
+            with ThreadPoolExecutor(max_workers=min(len(tool_calls), AGENT_TOOL_WORKERS)) as pool:
+                partials = list(pool.map(run_one, tool_calls))
+
+            # Merge in the original call order, as the sequential version would
+            response = Response(messages=[], agent=None, context_variables={})
+            for partial in partials:
+                response.messages.extend(partial.messages)
+                response.context_variables.update(partial.context_variables)
+                if partial.agent:
+                    response.agent = partial.agent
+
+        latency = time.perf_counter() - start
+        names = ", ".join(tool_call.function.name for tool_call in tool_calls)
+        get_metrics().record_hop(names, "tools", latency)
+        self._record_hop({"agent": names, "kind": "tools", "seconds": latency, "tokens": 0, "cost_usd": 0.0})
+        return response
+
+# Route agent completions through the shared gateway for concurrency
+# limits and coalescing of identical requests
+client = ParallelSwarm(client=gateway_openai_client())
 print("Swarm client initialized")
 
 class ConversationHistory:
     def __init__(self):
         self.messages: List[Dict[str, str]] = []
         self.max_history = 10  # Adjust based on your needs
+        # Swarm context variables carried between turns, e.g. the transcript
+        # this conversation is about
+        self.context_variables: Dict[str, str] = {}
 
     def add_message(self, role: str, content: str):
         self.messages.append({"role": role, "content": content})
@@ -31,22 +122,9 @@ class ConversationHistory:
     def get_messages(self) -> List[Dict[str, str]]:
         return self.messages
 
-# Initialize conversation history
+# Fallback for scripts and benchmarks; the UI passes one history per session
 conversation_history = ConversationHistory()
 
-class PodcastMemory:
-    def __init__(self):
-        self.episode_lists: Dict[str, List[Dict]] = {}
-        
-    def store_episodes(self, podcast_name: str, episodes: List[Dict]):
-        self.episode_lists[podcast_name] = episodes
-        
-    def get_episodes(self, podcast_name: str) -> Optional[List[Dict]]:
-        return self.episode_lists.get(podcast_name)
-
-# Initialize podcast memory
-podcast_memory = PodcastMemory()
-
 def transfer_to_explainer(*args, **kwargs):
     """Perform an explanation using user prompt and return the response."""
     print("Transferring to explainer")
@@ -74,8 +152,60 @@ def transfer_to_apple_podcast_agent(*args, **kwargs):
 def web_search(query):
     """Perform a web search using Tavily and return the response."""
     print(f"Performing web search for: {query}")
-    response = tavily_client.search(query)
-    return response
+    # Cached and shared across users, trimmed to a token budget
+    return get_web_search().search(query)
+
+def _transcript_text(result):
+    # Transcript helpers return either the text or a list of chunks
+    if isinstance(result, str):
+        return result
+    return "\n".join(str(part) for part in result)
+
+def fetch_transcript(prompt):
+    """Fetch the transcript of the YouTube video matching the prompt and store it for the transcript analyst."""
+    store = get_transcript_store()
+    video_id = youtube_id(prompt)
+    meta = store.meta(video_id) if video_id else None
+    if meta is not None:
+        print(f"Transcript {video_id} already stored")
+    else:
+        text = _transcript_text(get_transcript_from_prompt(prompt))
+        meta = store.add(video_id or f"yt-{hashlib.sha256(text.encode()).hexdigest()[:16]}", text, title=prompt)
+    # Only a reference goes into the context, the analyst retrieves chunks
+    return Result(
+        value=(
+            f"Transcript stored as {meta['id']} ({meta['chunks']} chunks, {meta['characters']} characters). "
+            "Transfer to the transcript analyst to answer questions about it."
+        ),
+        context_variables={"transcript_id": meta['id']},
+    )
+
+def transcribe_podcast_episode(episode_id, audio_path):
+    """Transcribe a downloaded podcast episode audio file and store it for the transcript analyst."""
+    store = get_transcript_store()
+    source_id = f"podcast-{episode_id}"
+    meta = store.meta(source_id)
+    if meta is None:
+        text = _transcript_text(process_audio_file(audio_path))
+        meta = store.add(source_id, text, title=str(episode_id), kind="podcast")
+    return Result(
+        value=f"Episode transcript stored as {meta['id']} ({meta['chunks']} chunks).",
+        context_variables={"transcript_id": meta['id']},
+    )
+
+def search_transcripts(question, transcript_id="", context_variables=None):
+    """Retrieve the transcript passages most relevant to a question. Defaults to the transcript of this conversation."""
+    # Never fall back to every stored transcript, those belong to other conversations
+    transcript_id = transcript_id or (context_variables or {}).get("transcript_id")
+    if not transcript_id:
+        return "No transcript in this conversation yet. Ask the YouTube Transcriber to fetch it first."
+    hits = get_transcript_store().search(question, [transcript_id])
+    if not hits:
+        return "No stored transcripts match. Ask the YouTube Transcriber to fetch the transcript first."
+    return "\n\n".join(
+        f"[{meta['id']} - {meta['title']}, part {index + 1}/{meta['chunks']}]\n{text}"
+        for _, meta, index, text in hits
+    )
 
 def transfer_to_podcast_episode_analyzer(*args, **kwargs):
     """Transfer control to the Podcast Episode Analyzer agent."""
@@ -149,21 +279,24 @@ yt_transcriber = Agent(
     instructions=(
         "As a specialized YouTube transcript retrieval agent, your primary responsibility is to fetch and process transcripts from YouTube videos.\n"
         "When given a topic or query, search for relevant YouTube videos and retrieve their transcripts.\n"
-        "Provide the full transcript to the transcript analyst for further processing."
+        "Transcripts are stored for the transcript analyst, hand over to it once the transcript is stored."
     ),
-    functions=[get_transcript_from_prompt],
+    functions=[fetch_transcript, transfer_to_transcript_analyst],
 )
 print("YouTube Transcriber created")
 
 transcript_analyst = Agent(
     name="Transcript Analyst",
-    model="o1",
+    # Needs tool calls, which o1 doesn't accept alongside parallel_tool_calls
+    model="gpt-4o",
     instructions=(
         "As a transcript analyst, your role is to analyze and answer questions about YouTube video transcripts.\n"
-        "You will receive transcripts from the YouTube Transcriber and user questions about the content.\n"
+        "Transcripts fetched by the YouTube Transcriber or transcribed from podcast episodes are stored, "
+        "use search_transcripts to retrieve the passages relevant to each question.\n"
         "Provide concise, accurate answers based on the information in the transcripts.\n"
         "If asked for specific information, search within the transcripts to find the most relevant parts."
     ),
+    functions=[search_transcripts],
 )
 print("Transcript Analyst created")
 
@@ -174,9 +307,15 @@ apple_podcast_agent = Agent(
         "As an Apple podcast specialist, your role is to handle queries related to Apple podcasts.\n"
         "You can search for podcast episodes and retrieve list of episodes.\n"
         "When a user asks about specific episodes or content, delegate to the Podcast Episode Analyzer.\n"
-        "Always share the full list of episodes you find with the Podcast Episode Analyzer."
+        "Always share the full list of episodes you find with the Podcast Episode Analyzer.\n"
+        "For questions about what was said in an episode, transcribe it and transfer to the transcript analyst."
     ),
-    functions=[get_podcast_episodes_by_title, transfer_to_podcast_episode_analyzer],
+    functions=[
+        get_podcast_episodes_by_title,
+        transcribe_podcast_episode,
+        transfer_to_podcast_episode_analyzer,
+        transfer_to_transcript_analyst
+    ],
 )
 print("Apple Podcast Agent created")
 
@@ -194,11 +333,49 @@ podcast_episode_analyzer = Agent(
     ),
 )
 
-def process_question(question: str):
+# Local intent rules checked in order, first match wins. Anything that
+# doesn't clearly match still goes through the manager.
+INTENT_RULES = [
+    (re.compile(r"youtu\.?be|\byoutube\b|\btranscript", re.I), "yt_transcriber"),
+    (re.compile(r"\bepisodes?\b", re.I), "podcast_episode_analyzer"),
+    (re.compile(r"\bpodcasts?\b", re.I), "apple_podcast_agent"),
+    (re.compile(r"\b(latest|news|today|this week|current|search the web|look up)\b", re.I), "researcher"),
+    (re.compile(r"^\s*(explain|eli5|what does .+ mean|define)\b", re.I), "explainer"),
+]
+
+def route_question(question: str, context_variables: Dict = None):
+    """Pick the agent for a question without an LLM call"""
+    if not AGENT_ROUTER:
+        return manager
+    for pattern, agent_name in INTENT_RULES:
+        if pattern.search(question):
+            # Episode questions need an episode list to work from
+            if agent_name == "podcast_episode_analyzer" and not podcast_memory.episode_lists:
+                agent_name = "apple_podcast_agent"
+            # Follow-ups on a video that's already stored skip the transcriber,
+            # whether they link it again or refer to the conversation's transcript
+            if agent_name == "yt_transcriber":
+                video_id = youtube_id(question)
+                if video_id is None and (context_variables or {}).get("transcript_id"):
+                    agent_name = "transcript_analyst"
+                elif video_id is not None and get_transcript_store().has(video_id):
+                    agent_name = "transcript_analyst"
+            agent = globals()[agent_name]
+            print(f"Routing directly to {agent.name}")
+            return agent
+    return manager
+
+def process_question(question: str, history: ConversationHistory = None):
+    """Answer a question within a conversation, each Streamlit session passes its own history"""
     print(f"Processing question: {question}")
+    history = history if history is not None else conversation_history
     
     # Add the new question to history
-    conversation_history.add_message("user", question)
+    history.add_message("user", question)
+    # A link to a stored video makes it the transcript this conversation is about
+    video_id = youtube_id(question)
+    if video_id and get_transcript_store().has(video_id):
+        history.context_variables["transcript_id"] = video_id
     
     # Create the messages list with system message and conversation history
     messages = [
@@ -218,15 +395,28 @@ def process_question(question: str):
                 podcast_context += f"- {ep.get('title', 'Unknown Title')} (ID: {ep.get('id', 'Unknown ID')})\n"
         messages.append({"role": "system", "content": podcast_context})
     
-    messages.extend(conversation_history.get_messages())
+    messages.extend(history.get_messages())
     
-    # Run the conversation
-    response = client.run(
-        agent=manager,
+    # Run the conversation, starting from the specialist when the router
+    # is confident to save the manager's hop
+    response, hops = client.run_with_hops(
+        agent=route_question(question, history.context_variables),
         messages=messages,
+        context_variables=history.context_variables,
+    )
+    history.context_variables = dict(response.context_variables)
+
+    llm_hops = [hop for hop in hops if hop["kind"] == "llm"]
+    print(
+        f"Answered in {len(llm_hops)} LLM round-trips, "
+        f"{sum(hop['seconds'] for hop in hops):.2f}s, "
+        f"{sum(hop['tokens'] for hop in hops)} tokens, "
+        f"${sum(hop['cost_usd'] for hop in hops):.4f}"
     )
+    for hop in hops:
+        print(f"  {hop['kind']:<5} {hop['agent']}: {hop['seconds']:.2f}s, {hop['tokens']} tokens")
     
     # Add the response to history
-    conversation_history.add_message("assistant", response.messages[-1]["content"])
+    history.add_message("assistant", response.messages[-1]["content"])
     
     return response.messages[-1]["content"]
@@ -1,9 +1,24 @@
 import streamlit as st
-from components.presentation_assistant import PresentationAssistant
-from components import policy, legal, hr, calendar, email, coding, ask, simplify   
+import importlib
 from utils.config import *
 import os
 
+# Page key -> (menu label, module, entry point). A page's module is only
+# imported the first time the page is shown, so opening Decks never loads
+# LangChain/FAISS and opening Policy never loads the agents.
+# Profile import cost with: python -m benchmarks.import_profile
+PAGES = {
+    'decks': ("📝 Decks", "components.presentation_assistant", "show_presentation"),
+    'policy': ("📜 Policy", "components.policy", "show_policy"),
+    'legal': ("🧑‍⚖️ Legal", "components.legal", "show_legal"),
+    'hr': ("🧩 Talent", "components.hr", "show_hr"),
+    'calendar': ("📅 Diary", "components.calendar", "show_calendar"),
+    'email': ("📧 Email", "components.email", "show_email"),
+    'coding': ("💻 Coding", "components.coding", "show_coding"),
+    'simplify': ("🧩 Simplify", "components.simplify", "show_simplify"),
+    'ask': ("🤔 Any Q&A", "components.ask", "show_ask"),
+}
+
 # Set page to wide mode
 
 st.set_page_config(
@@ -22,6 +37,12 @@ def add_custom_css():
     with open(css_file) as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+def load_page(page):
+    """Import a page's module on first use and return its entry point"""
+    _, module_name, entry_point = PAGES[page]
+    # import_module is a dict lookup once the module is in sys.modules
+    return getattr(importlib.import_module(module_name), entry_point)
+
 def set_page(page):
     st.session_state.page = page
     
@@ -30,23 +51,12 @@ def main():
     if 'page' not in st.session_state:
         st.session_state.page = 'ask'  # Set default page
         
-    presentation_assistant = PresentationAssistant()
     initialize_session_state()
     sidebar()
     add_custom_css()
 
     st.markdown('<div class="header-menu">', unsafe_allow_html=True)
-    buttons = [
-        ("📝 Decks", 'decks'),
-        ("📜 Policy", 'policy'),
-        ("🧑‍⚖️ Legal", 'legal'),
-        ("🧩 Talent", 'hr'),
-        ("📅 Diary", 'calendar'),
-        ("📧 Email", 'email'),
-        ("💻 Coding", 'coding'),
-        ("🧩 Simplify", 'simplify'),
-        ("🤔 Any Q&A", 'ask')
-    ]
+    buttons = [(label, page) for page, (label, _, _) in PAGES.items()]
 
     cols = st.columns(len(buttons))
     for col, (label, page) in zip(cols, buttons):
@@ -64,27 +74,10 @@ def main():
 
 
     # Page navigation logic
-    if 'page' not in st.session_state:
+    if st.session_state.page not in PAGES:
         st.session_state.page = 'ask'
 
-    if st.session_state.page == 'decks':
-        presentation_assistant.render()
-    elif st.session_state.page == 'policy':
-        policy.show_policy()    
-    elif st.session_state.page == 'legal':
-        legal.show_legal()
-    elif st.session_state.page == 'hr':
-        hr.show_hr()
-    elif st.session_state.page == 'calendar':
-        calendar.show_calendar()
-    elif st.session_state.page == 'email':
-        email.show_email()  
-    elif st.session_state.page == 'coding':
-        coding.show_coding()
-    elif st.session_state.page == 'simplify':
-        simplify.show_simplify()
-    elif st.session_state.page == 'ask':
-        ask.show_ask()  
+    load_page(st.session_state.page)()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""
+Import-time profile of the app's startup and of each page module.
+
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --top 25 --module components.policy
+
+Each module is imported in a fresh interpreter with -X importtime, so the
+numbers are cold-start costs. Reports total import time, peak RSS and the
+most expensive imports underneath.
+"""
+import argparse
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Prints peak RSS (KiB on Linux) after the import so it can be read back
+PROBE = "import resource, sys; __import__(sys.argv[1]); " \
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def page_modules():
+    """Page modules from the registry in app.py, read without importing it"""
+    tree = ast.parse((ROOT / "app.py").read_text())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "PAGES" for t in node.targets):
+            return sorted({entry[1] for entry in ast.literal_eval(node.value).values()})
+    return []
+
+
+def profile(module):
+    """(total seconds, peak RSS MB, [(cumulative seconds, name)]) for a cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, module],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+        return None, None, error
+
+    # Lines look like: "import time:   self [us] |  cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by two extra spaces per level after "| "
+        imports.append((int(cumulative) / 1_000_000, name.rstrip()[1:]))
+
+    # The module's own line is cumulative over everything it pulled in
+    total = next((seconds for seconds, name in imports if name == module), 0.0)
+    rss_mb = int(result.stdout.strip().splitlines()[-1]) / 1024
+    return total, rss_mb, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the app's modules")
+    parser.add_argument("--module", action="append", help="Module to profile, repeatable (default: app startup and every page)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module")
+    args = parser.parse_args()
+
+    # utils.config is what app.py itself imports before a page is chosen
+    modules = args.module or ["streamlit", "utils.config", *page_modules()]
+    print(f"{'module':<40} {'import s':>9} {'peak RSS MB':>12}")
+    reports = {}
+    for module in modules:
+        total, rss_mb, imports = profile(module)
+        if total is None:
+            print(f"{module:<40} {'error':>9}  {imports}")
+            continue
+        print(f"{module:<40} {total:9.3f} {rss_mb:12.1f}")
+        reports[module] = imports
+
+    for module, imports in reports.items():
+        print(f"\nSlowest imports under {module}:")
+        for seconds, name in sorted(imports, reverse=True)[:args.top]:
+            print(f"  {seconds:8.3f}s  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Headless benchmarks for the assistant hot paths, run against the local
+mock LLM/embedding server so no network access or API keys are needed.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --pages 20,100 --docs 10,50 --compare benchmarks/results/<previous>.json
+
+Each case runs in its own process so peak RSS is measured per case.
+Results are written as JSON to benchmarks/results/.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Everything below must talk to the mock server, never a real provider
+os.environ.setdefault("LLM_PROVIDER", "Local")
+os.environ.setdefault("LOCAL_LLM_LATENCY_MS", "20")
+os.environ.setdefault("LOCAL_LLM_TOKENS_PER_SECOND", "0")
+os.environ.setdefault("OPENAI_API_KEY", "local")
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_PATH = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(ROOT))
+
+POLICY_TEXT = (
+    "Section {section}.{clause} Employees must obtain approval from their line manager "
+    "before incurring travel expenses above the limit defined in Appendix {section}. "
+    "Gifts and entertainment over the threshold are reported to Compliance within five "
+    "business days. The CAO reviews exceptions quarterly and escalates breaches to the "
+    "Risk Committee. "
+)
+
+
+class UploadedBytes:
+    """Stand-in for Streamlit's UploadedFile"""
+
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "mean_ms": statistics.mean(ordered) * 1000,
+    }
+
+
+def summarize(latencies, elapsed, **extra):
+    result = {
+        "operations": len(latencies),
+        "seconds": elapsed,
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        **percentiles(latencies),
+        **extra,
+    }
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def make_pdf(num_pages):
+    import fitz
+    document = fitz.open()
+    for i in range(num_pages):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Quarterly review - slide {i + 1}", fontsize=24)
+        for line in range(20):
+            page.insert_text((72, 120 + line * 24), f"Revenue line {line}: {1000 + i * line:,} USD ({line * 1.5:.1f}%)")
+        page.draw_rect(fitz.Rect(350, 400, 550, 700), color=(0, 0, 1), fill=(0.8, 0.8, 1))
+    return document.tobytes()
+
+
+def bench_rasterize(num_pages):
+    """PresentationAssistant page rasterization and vision payload encoding"""
+    import fitz
+    from components.presentation_assistant import PresentationAssistant
+    from utils.page_cache import encode_image
+
+    pdf_document = fitz.open(stream=make_pdf(num_pages), filetype="pdf")
+    latencies = []
+    start = time.perf_counter()
+    for page_number in range(pdf_document.page_count):
+        t = time.perf_counter()
+        img = PresentationAssistant.rasterize_page(pdf_document, page_number)
+        encode_image(img)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start, pages=num_pages)
+
+
+def bench_page_cache(num_pages):
+    """Paging through a deck with the render cache and prefetch, as the UI does"""
+    from utils.page_cache import PageRenderCache, pdf_hash
+
+    pdf_bytes = make_pdf(num_pages)
+    doc_hash = pdf_hash(pdf_bytes)
+    cache = PageRenderCache()
+    latencies = []
+    start = time.perf_counter()
+    for page_number in range(num_pages):
+        t = time.perf_counter()
+        cache.get(doc_hash, pdf_bytes, page_number)
+        latencies.append(time.perf_counter() - t)
+        # Roughly the time a reader spends on a slide before clicking Next
+        time.sleep(0.05)
+    return summarize(latencies, time.perf_counter() - start, pages=num_pages, **cache.stats())
+
+
+def make_policies(num_docs, clauses=40):
+    files = []
+    for d in range(num_docs):
+        text = "".join(POLICY_TEXT.format(section=d + 1, clause=c + 1) for c in range(clauses))
+        files.append(UploadedBytes(f"policy_{d + 1}.txt", text.encode()))
+    return files
+
+
+def bench_policy(num_docs, num_queries):
+    """
+    Policy ingestion and retrieval through the same pipeline, manager and
+    ScopedRetriever that PolicyAssistant wires together. PolicyAssistant
+    itself is not driven: it reads and writes st.session_state, which
+    doesn't persist outside `streamlit run`, and its answers come from the
+    mock LLM, so the LLM call would only add the mock's fixed latency.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from utils.embeddings import get_cached_embeddings
+    from utils.ingestion import IngestionPipeline
+    from utils.vectorstore import ScopedRetriever, VectorStoreManager
+
+    with tempfile.TemporaryDirectory() as base_path:
+        embeddings = get_cached_embeddings(Path(base_path) / "embedding_cache")
+        manager = VectorStoreManager(base_path, embeddings)
+        # Same splitter settings as PolicyAssistant
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        pipeline = IngestionPipeline(splitter, embeddings)
+
+        start = time.perf_counter()
+        docs, vectors = {}, {}
+        for filename, split_docs, file_vectors, error in pipeline.run(make_policies(num_docs)):
+            if error is not None:
+                raise error
+            docs[filename] = split_docs
+            vectors[filename] = file_vectors
+        manager.add_documents(docs, vectors)
+        manager.wait_for_merge()
+        ingest_seconds = time.perf_counter() - start
+        num_chunks = sum(len(d) for d in docs.values())
+
+        filenames = list(docs)
+        latencies = []
+        start = time.perf_counter()
+        for i in range(num_queries):
+            query = f"What is the approval limit in Section {i % num_docs + 1}.{i % 40 + 1}?"
+            # PolicyAssistant always scopes to the selected documents: every
+            # document, or a few of them
+            scope = filenames if i % 2 == 0 else filenames[i % len(filenames):][:3]
+            t = time.perf_counter()
+            ScopedRetriever(manager=manager, filenames=scope).invoke(query)
+            latencies.append(time.perf_counter() - t)
+
+        return summarize(
+            latencies,
+            time.perf_counter() - start,
+            documents=num_docs,
+            chunks=num_chunks,
+            ingest_seconds=ingest_seconds,
+            ingest_chunks_per_s=num_chunks / ingest_seconds if ingest_seconds > 0 else 0.0,
+        )
+
+
+def bench_agents(num_questions):
+    """agents.process_question end to end against the mock LLM"""
+    try:
+        import agents
+    except ImportError as e:
+        return {"skipped": f"agents unavailable: {e}"}
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(num_questions):
+        t = time.perf_counter()
+        agents.process_question(f"Explain item {i} of the risk framework")
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start, questions=num_questions)
+
+
+def _run_case(queue, fn, args):
+    try:
+        queue.put(fn(*args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(fn, *args):
+    """Run a benchmark in a fresh process so its peak RSS is its own"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(queue, fn, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current, previous):
+    """Print p50 and throughput changes against an earlier results file"""
+    for name, result in current["cases"].items():
+        before = previous.get("cases", {}).get(name)
+        if not before or "p50_ms" not in result or "p50_ms" not in before:
+            continue
+        p50 = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        throughput = (
+            (result["throughput_per_s"] - before["throughput_per_s"]) / before["throughput_per_s"] * 100
+            if before["throughput_per_s"] else 0.0
+        )
+        print(f"{name:<28} p50 {p50:+7.1f}%   throughput {throughput:+7.1f}%")
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the assistant pipelines")
+    parser.add_argument("--pages", type=parse_sizes, default=[20, 100], help="Deck sizes, e.g. 20,100")
+    parser.add_argument("--docs", type=parse_sizes, default=[10, 50], help="Policy corpus sizes")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--skip", default="", help="Comma separated: rasterize,policy,agents")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="Earlier results file to diff against")
+    args = parser.parse_args()
+    skip = set(args.skip.split(","))
+
+    cases = {}
+    if "rasterize" not in skip:
+        for pages in args.pages:
+            cases[f"rasterize[{pages} pages]"] = run_isolated(bench_rasterize, pages)
+            cases[f"page_cache[{pages} pages]"] = run_isolated(bench_page_cache, pages)
+    if "policy" not in skip:
+        for docs in args.docs:
+            cases[f"policy[{docs} docs]"] = run_isolated(bench_policy, docs, args.queries)
+    if "agents" not in skip:
+        cases[f"agents[{args.questions} questions]"] = run_isolated(bench_agents, args.questions)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cases": cases,
+    }
+    for name, result in cases.items():
+        if "p50_ms" in result:
+            print(f"{name:<28} {result['throughput_per_s']:9.1f} ops/s  "
+                  f"p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                  f"p99 {result['p99_ms']:8.2f}ms  rss {result['peak_rss_mb']:7.1f}MB")
+        else:
+            print(f"{name:<28} {result}")
+
+    output = args.output or RESULTS_PATH / f"{results['timestamp'].replace(':', '')}-{results['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import streamlit as st
-from agents import process_question  # Import the process_question function
 
 def show_ask():
     st.title("Ask me Anything")
@@ -17,8 +16,16 @@ def show_ask():
         st.session_state.user_question = user_question
         st.write(f"You asked: {st.session_state.user_question}")
         
-        # Process the user's question using the agent
-        st.session_state.answer = process_question(st.session_state.user_question)
+        # Process the user's question using the agent. Imported here so the
+        # agents (Swarm, Tavily, tools) only load once a question is asked
+        from agents import ConversationHistory, process_question
+        # History and transcript context belong to this session only
+        if 'agent_history' not in st.session_state:
+            st.session_state.agent_history = ConversationHistory()
+        st.session_state.answer = process_question(
+            st.session_state.user_question,
+            st.session_state.agent_history
+        )
     
     # Display the response from the agent
     if st.session_state.answer:
@@ -1,26 +1,79 @@
 import streamlit as st
-import tempfile
 import os
-import json
 from pathlib import Path
 from langchain.chains import ConversationalRetrievalChain
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
+from utils.answer_cache import SemanticAnswerCache
+from utils.clients import default_provider
+from utils.llm_gateway import gateway_openai_client
+from utils.embeddings import get_cached_embeddings
+from utils.ingestion import IngestionPipeline, SUPPORTED_EXTENSIONS
+from utils.vectorstore import VectorStoreManager, ScopedRetriever
+
+BASE_PATH = Path("data/vectorstore")
+
+@st.cache_resource
+def get_store_manager():
+    """One shared index manager per process, reused across sessions and reruns"""
+    # Create directories if they don't exist
+    BASE_PATH.mkdir(parents=True, exist_ok=True)
+    embeddings = get_cached_embeddings(BASE_PATH / "embedding_cache")
+    # Index type and recall/latency knobs, see VectorStoreManager
+    return VectorStoreManager(
+        BASE_PATH,
+        embeddings,
+        index_type=os.getenv("POLICY_INDEX_TYPE", "flat"),
+        train_threshold=int(os.getenv("POLICY_INDEX_TRAIN_THRESHOLD", 10_000)),
+        nprobe=int(os.getenv("POLICY_INDEX_NPROBE", 16)),
+        ef_search=int(os.getenv("POLICY_INDEX_EF_SEARCH", 64))
+    )
+
+@st.cache_resource
+def get_answer_cache():
+    """Process-wide semantic cache of policy answers"""
+    BASE_PATH.mkdir(parents=True, exist_ok=True)
+    return SemanticAnswerCache(
+        BASE_PATH / "answer_cache.jsonl",
+        threshold=float(os.getenv("POLICY_ANSWER_CACHE_THRESHOLD", 0.98))
+    )
+
+class StreamHandler(BaseCallbackHandler):
+    """Write LLM tokens into a Streamlit placeholder as they arrive"""
+    def __init__(self, placeholder, prefix=""):
+        self.placeholder = placeholder
+        self.prefix = prefix
+        self.text = ""
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.text += token
+        self.placeholder.markdown(self.prefix + self.text)
 
 class PolicyAssistant:
     def __init__(self):
-        self.base_path = Path("data/vectorstore")
-        self.metadata_path = self.base_path / "document_metadata.json"
-        self.vectorstore_path = self.base_path / "vectorstore"
-        
-        # Create directories if they don't exist
-        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.base_path = BASE_PATH
         
         # Initialize components first
-        self.llm = ChatOpenAI(temperature=0)
-        self.embeddings = OpenAIEmbeddings()
+        self.store = get_store_manager()
+        self.answer_cache = get_answer_cache()
+        # Cheap to create per rerun, connections come from the shared pool
+        # and non-streaming completions go through the LLM gateway
+        provider = default_provider()
+        llm_settings = {}
+        if provider == "Local":
+            from utils.local_llm import get_local_base_url
+            llm_settings = {"base_url": get_local_base_url(), "api_key": "local"}
+        self.llm = ChatOpenAI(
+            temperature=0,
+            streaming=st.session_state.get("streaming", False),
+            # Final stream chunk carries usage, so streamed calls are metered too
+            stream_usage=True,
+            client=gateway_openai_client(provider).chat.completions,
+            **llm_settings
+        )
+        self.embeddings = self.store.embeddings
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, 
             chunk_overlap=200
@@ -31,105 +84,65 @@ class PolicyAssistant:
         self.load_existing_documents()
 
     def load_existing_documents(self):
-        """Load existing documents and vectorstore from disk"""
+        """Load existing documents and vectorstore from the shared store"""
         try:
-            # Load document metadata
-            if self.metadata_path.exists():
-                with open(self.metadata_path, 'r') as f:
-                    st.session_state.document_objects = json.load(f)
-            
-            # Load vectorstore if it exists
-            if self.vectorstore_path.exists():
-                st.session_state.vectorstore = FAISS.load_local(
-                    str(self.vectorstore_path),
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
+            st.session_state.document_objects = self.store.get_documents()
+            st.session_state.vectorstore = self.store.get_vectorstore()
                 
         except Exception as e:
             st.error(f"Error loading existing documents: {str(e)}")
             st.session_state.document_objects = {}
             st.session_state.vectorstore = None
 
-    def save_documents_metadata(self):
-        """Save document metadata to disk"""
-        try:
-            # Save only the metadata, not the full documents
-            metadata = {
-                filename: {
-                    'filename': filename,
-                    'num_chunks': len(docs)
-                }
-                for filename, docs in st.session_state.document_objects.items()
-            }
-            with open(self.metadata_path, 'w') as f:
-                json.dump(metadata, f)
-        except Exception as e:
-            st.error(f"Error saving document metadata: {str(e)}")
-
-    def save_vectorstore(self):
-        """Save vectorstore to disk"""
-        try:
-            if st.session_state.vectorstore:
-                st.session_state.vectorstore.save_local(
-                    str(self.vectorstore_path),
-                    allow_dangerous_deserialization=True
-                )
-        except Exception as e:
-            st.error(f"Error saving vectorstore: {str(e)}")
-
     def handle_document_upload(self, files):
         """Handle document upload and processing"""
         if not files:
             return
-            
+
+        new_files = []
         for file in files:
-            try:
-                # Check if document already exists
-                if file.name in st.session_state.document_objects:
-                    st.warning(f"Document {file.name} already exists. Skipping...")
-                    continue
+            # Check if document already exists
+            if file.name in st.session_state.document_objects or file.name in [f.name for f in new_files]:
+                st.warning(f"Document {file.name} already exists. Skipping...")
+            elif not file.name.endswith(SUPPORTED_EXTENSIONS):
+                st.error(f"Unsupported file type: {file.name}")
+            else:
+                new_files.append(file)
 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file.name) as tmp_file:
-                    tmp_file.write(file.getvalue())
-                    file_path = tmp_file.name
+        if not new_files:
+            return
 
-                # Load document based on file type
-                loader = None
-                if file.name.endswith('.pdf'):
-                    loader = PyPDFLoader(file_path)
-                elif file.name.endswith('.txt'):
-                    loader = TextLoader(file_path)
-                elif file.name.endswith('.docx'):
-                    loader = Docx2txtLoader(file_path)
-                else:
-                    st.error(f"Unsupported file type: {file.name}")
-                    continue
+        # Files are parsed in parallel and embedded as they finish; the whole
+        # upload is then persisted as one batch
+        pipeline = IngestionPipeline(self.text_splitter, self.embeddings)
+        progress = st.progress(0.0, text="Processing documents...")
+        new_docs, new_vectors = {}, {}
+        for i, (filename, split_docs, vectors, error) in enumerate(pipeline.run(new_files), start=1):
+            if error is not None:
+                st.error(f"Error processing {filename}: {str(error)}")
+            else:
+                new_docs[filename] = split_docs
+                new_vectors[filename] = vectors
+            progress.progress(i / len(new_files), text=f"Processed {i} of {len(new_files)} documents")
+        progress.empty()
+        if pipeline.last_stats.get('chunks'):
+            st.caption(f"Embedded {pipeline.last_stats['chunks']} chunks at "
+                       f"{pipeline.last_stats['chunks_per_second']:.1f} chunks/s")
 
-                documents = loader.load()
-                split_docs = self.text_splitter.split_documents(documents)
-                
-                # Store the actual documents
-                st.session_state.document_objects[file.name] = split_docs
-                
-                # Update vectorstore
-                if st.session_state.vectorstore is None:
-                    st.session_state.vectorstore = FAISS.from_documents(
-                        split_docs,
-                        self.embeddings
-                    )
-                else:
-                    st.session_state.vectorstore.add_documents(split_docs)
-                
-                # Save to disk
-                self.save_documents_metadata()
-                self.save_vectorstore()
-                
-                os.unlink(file_path)
-                st.success(f"Successfully processed and saved {file.name}")
-                
-            except Exception as e:
-                st.error(f"Error processing {file.name}: {str(e)}")
+        if not new_docs:
+            return
+
+        try:
+            self.store.add_documents(new_docs, new_vectors)
+            self.answer_cache.invalidate(new_docs.keys())
+            st.session_state.document_objects = self.store.get_documents()
+            st.session_state.vectorstore = self.store.get_vectorstore()
+
+            for filename in new_docs:
+                st.success(f"Successfully processed and saved {filename}")
+
+        except Exception as e:
+            st.error(f"Error saving documents: {str(e)}")
 
     @staticmethod
     def initialize_session_state():
@@ -145,31 +158,12 @@ class PolicyAssistant:
             if key not in st.session_state:
                 st.session_state[key] = value
 
-    def process_documents(self, selected_docs):
-        """Process documents and update vectorstore"""
-        try:
-            all_docs = []
-            for doc in selected_docs:
-                if doc in st.session_state.document_objects:
-                    all_docs.extend(st.session_state.document_objects[doc])
-            
-            if all_docs:
-                st.session_state.vectorstore = FAISS.from_documents(
-                    all_docs,
-                    self.embeddings
-                )
-                return True
-            return False
-        except Exception as e:
-            st.error(f"Error processing documents: {str(e)}")
-            return False
-
     def get_available_documents(self):
         """Get list of available documents"""
         return list(st.session_state.document_objects.keys())
 
-    def chat_with_documents(self, query, documents):
-        """Process chat query with selected documents"""
+    def chat_with_documents(self, query, documents, placeholder=None):
+        """Process chat query with selected documents, streaming into placeholder if given"""
         if not documents:
             st.error("Please select some documents first!")
             return
@@ -178,19 +172,54 @@ class PolicyAssistant:
             st.error("No vectorstore available. Please upload documents first.")
             return
 
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            self.llm,
-            st.session_state.vectorstore.as_retriever(),
-            return_source_documents=True
-        )
+        # Rewrite follow-ups into a standalone question so the cache and the
+        # chain both work on the same text
+        standalone = self.condense_question(query, st.session_state.chat_history)
+        scope = self.store.fingerprint(documents)
+        question_vector = self.embeddings.embed_query(standalone)
+
+        cached = self.answer_cache.lookup(question_vector, scope, standalone)
+        if cached is not None:
+            answer, sources = cached["answer"], cached["sources"]
+        else:
+            # Search only the selected documents' vectors in the shared index
+            retriever = ScopedRetriever(manager=self.store, filenames=list(documents))
+            qa_chain = ConversationalRetrievalChain.from_llm(
+                self.llm,
+                retriever,
+                return_source_documents=True
+            )
+
+            callbacks = [StreamHandler(placeholder, "Answer: ")] if placeholder is not None else []
+            result = qa_chain(
+                {
+                    "question": standalone, 
+                    "chat_history": []
+                },
+                callbacks=callbacks
+            )
+            answer = result["answer"]
+            sources = []
+            for doc in result["source_documents"]:
+                source = {
+                    'filename': doc.metadata.get('filename', doc.metadata.get('source')),
+                    'page': doc.metadata.get('page')
+                }
+                if source not in sources:
+                    sources.append(source)
+            self.answer_cache.store(standalone, question_vector, scope, documents, answer, sources)
 
-        result = qa_chain({
-            "question": query, 
-            "chat_history": st.session_state.chat_history
-        })
+        st.session_state.last_sources = sources
+        st.session_state.chat_history.append((query, answer))
+        return answer
 
-        st.session_state.chat_history.append((query, result["answer"]))
-        return result["answer"]
+    def condense_question(self, query, chat_history):
+        """Turn a follow-up question into a standalone one using the chat history"""
+        if not chat_history:
+            return query
+        history = "".join(f"\nHuman: {q}\nAssistant: {a}" for q, a in chat_history)
+        prompt = CONDENSE_QUESTION_PROMPT.format(chat_history=history, question=query)
+        return self.llm.invoke(prompt).content
 
     def handle_document_selection(self, documents):
         selected = st.multiselect(
@@ -204,7 +233,7 @@ class PolicyAssistant:
         
         # If documents are selected, use the existing vectorstore
         if selected and st.session_state.vectorstore:
-            # No need to reprocess documents as they're already in the vectorstore
+            # No need to reprocess documents, queries are filtered by filename
             return True
 
     def handle_functionality_selection(self):
@@ -264,14 +293,19 @@ class PolicyAssistant:
                     st.error("Please select at least one document first!")
                 else:
                     st.session_state.user_query = user_query
+                    answer_area = st.empty()
                     with st.spinner("Running..."):
                         try:
                             response = self.chat_with_documents(
                                 user_query,
-                                st.session_state.selected_documents
+                                st.session_state.selected_documents,
+                                placeholder=answer_area if st.session_state.get("streaming", False) else None
                             )
                             if response:
-                                st.write("Answer:", response)
+                                answer_area.markdown(f"Answer: {response}")
+                                for source in st.session_state.get("last_sources", []):
+                                    page = f" (page {source['page'] + 1})" if source['page'] is not None else ""
+                                    st.caption(f"Source: {source['filename']}{page}")
                             else:
                                 st.error("No response received from chat function")
                         except Exception as e:
@@ -1,13 +1,27 @@
+import os
+from concurrent.futures import as_completed
 import streamlit as st
 import fitz
-from PIL import Image
-from utils.llm_utils import get_llm_response
-from utils.prompts import NUMERICAL_ANALYSIS_PROMPT, CRITIQUE_ANALYSIS_PROMPT, PRESENTATION_QA_PROMPT, PRESENTATION_NOTES_PROMPT, PRESENTATION_WHAT_IS_NOT_OBVIOUS_PROMPT, PRESENTATION_SUMMARIZE_PROMPT
-import io
-import base64
+from utils.llm_utils import get_llm_response, get_llm_responses, stream_llm_response
+from utils.prompts import NUMERICAL_ANALYSIS_PROMPT, CRITIQUE_ANALYSIS_PROMPT, PRESENTATION_QA_PROMPT, PRESENTATION_NOTES_PROMPT, PRESENTATION_WHAT_IS_NOT_OBVIOUS_PROMPT, PRESENTATION_SUMMARIZE_PROMPT, PRESENTATION_DECK_REPORT_PROMPT
+from utils.page_cache import get_page_cache, pdf_hash, rasterize_page, use_text_layer
 from styles.presentation_styles import PresentationStyles
 
+# hybrid sends text-heavy slides as text and the rest as images,
+# vision always sends the image, text only falls back to it for empty pages
+ANALYSIS_MODE = os.getenv("DECK_ANALYSIS_MODE", "hybrid")
+
 class PresentationAssistant:
+    # Predefined analyses in dropdown order
+    ANALYSIS_PROMPTS = {
+        "Summarize": PRESENTATION_SUMMARIZE_PROMPT,
+        "Check Numbers": NUMERICAL_ANALYSIS_PROMPT,
+        "Critique and Reword": CRITIQUE_ANALYSIS_PROMPT,
+        "Prepare Q&A": PRESENTATION_QA_PROMPT,
+        "Draft Speaker Notes": PRESENTATION_NOTES_PROMPT,
+        "What is not obvious?": PRESENTATION_WHAT_IS_NOT_OBVIOUS_PROMPT,
+    }
+
     def __init__(self):
         # Initialize session state variables with a more persistent structure
         if 'presentation_state' not in st.session_state:
@@ -18,7 +32,8 @@ class PresentationAssistant:
                 'analysis_results': {},
                 'last_page_analyzed': None,
                 'selected_pages': [],
-                'pdf_bytes': None  # Initialize pdf_bytes to None
+                'pdf_bytes': None,  # Initialize pdf_bytes to None
+                'pdf_hash': None
             }
         else:
             # Ensure all expected keys exist in presentation_state
@@ -29,7 +44,8 @@ class PresentationAssistant:
                 'analysis_results': {},
                 'last_page_analyzed': None,
                 'selected_pages': [],
-                'pdf_bytes': None
+                'pdf_bytes': None,
+                'pdf_hash': None
             }
             for key, default_value in expected_keys.items():
                 if key not in st.session_state.presentation_state:
@@ -42,14 +58,12 @@ class PresentationAssistant:
         # Apply styles once during initialization
         st.markdown(f"<style>{PresentationStyles.get_all_styles()}</style>", unsafe_allow_html=True)
 
-    def _encode_image_base64(self, img):
-        """Helper method to encode PIL Image to base64 string"""
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='PNG', optimize=True)
-        img_byte_arr = img_byte_arr.getvalue()
-        return base64.b64encode(img_byte_arr).decode()
+    @staticmethod
+    def rasterize_page(pdf_document, page_number, max_height=800):
+        """Render a PDF page to a PIL image no taller than max_height pixels"""
+        return rasterize_page(pdf_document, page_number, max_height=max_height)
 
-    def create_message_with_image(self, text, image_base64):
+    def create_message_with_image(self, text, image_url):
         """
         Create a generic message structure that can be formatted for either provider
         """
@@ -63,12 +77,125 @@ class PresentationAssistant:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{image_base64}"
+                        "url": image_url
                     }
                 }
             ]
         }]
 
+    def create_message_with_text(self, text, layer):
+        """Message carrying a slide's extracted text and tables instead of its image"""
+        content = f"{text}\n\n# Slide Text\n\n{layer['text']}"
+        if layer['tables']:
+            content += "\n\n# Tables\n\n" + "\n\n".join(layer['tables'])
+        return [{"role": "user", "content": content}]
+
+    def _slide_messages(self, text, doc_hash, pdf_bytes, page, provider):
+        """Messages for a slide, from its text layer when the slide is mostly text"""
+        cache = get_page_cache()
+        if ANALYSIS_MODE != "vision":
+            layer = cache.text_layer(doc_hash, pdf_bytes, page)
+            if use_text_layer(layer, ANALYSIS_MODE):
+                return self.create_message_with_text(text, layer)
+        # Encoded once per page and provider resolution
+        image_url = cache.encoded(doc_hash, pdf_bytes, page, provider)
+        return self.create_message_with_image(text, image_url)
+
+    def _page_messages(self, text):
+        """Messages for the current page"""
+        state = st.session_state.presentation_state
+        return self._slide_messages(
+            text,
+            state['pdf_hash'],
+            state['pdf_bytes'],
+            state['current_page'],
+            st.session_state.provider
+        )
+
+    def _run_batch(self, analysis_type, pages, area):
+        """
+        Run one analysis over many slides at once. Slides are prepared (text
+        layer or encoded image) in parallel in worker processes, requests go
+        out concurrently through the gateway (which enforces the provider's
+        concurrency limit), and each result is shown as soon as it arrives.
+        Returns the merged report.
+        """
+        state = st.session_state.presentation_state
+        provider = st.session_state.provider
+        prompt = self.ANALYSIS_PROMPTS[analysis_type]
+        header = f"{analysis_type} - {len(pages)} slides"
+        results = {}
+
+        def slide_report():
+            return "\n\n".join(
+                f"**Slide {page + 1}**\n\n{results[page]}" for page in sorted(results)
+            )
+
+        progress = st.progress(0.0, text=f"Analyzing {len(pages)} slides...")
+
+        def record(page, content):
+            results[page] = content
+            progress.progress(
+                len(results) / len(pages),
+                text=f"Analyzed {len(results)} of {len(pages)} slides"
+            )
+            self._render_response(area, header, slide_report())
+
+        prepared = get_page_cache().prepare_batch(
+            state['pdf_hash'], state['pdf_bytes'], pages, provider, ANALYSIS_MODE
+        )
+
+        def requests():
+            # Sent as soon as each slide is ready; a slide that can't be
+            # prepared is reported on its own instead of ending the batch
+            for future in as_completed(prepared):
+                page = prepared[future]
+                try:
+                    layer, image_url = future.result()
+                except Exception as e:
+                    print(f"\nError preparing slide {page + 1}: {str(e)}")
+                    yield page, e
+                    continue
+                if image_url is None:
+                    yield page, self.create_message_with_text(prompt, layer)
+                else:
+                    yield page, self.create_message_with_image(prompt, image_url)
+
+        for page, content, error in get_llm_responses(requests()):
+            record(page, f"Error: {error}" if error is not None else content)
+        progress.empty()
+
+        if len(pages) == 1:
+            return slide_report()
+
+        # Merge the per-slide results into a deck-level report
+        messages = [{
+            "role": "user",
+            "content": f"{PRESENTATION_DECK_REPORT_PROMPT}\n\n# Slide Results\n\n{slide_report()}"
+        }]
+        prefix = f"{slide_report()}\n\n---\n\n**Deck Report**\n\n"
+        return prefix + self._run_llm(messages, area, header, prefix=prefix)
+
+    def _render_response(self, area, header, content):
+        """Draw the response header and content into a single placeholder"""
+        with area.container():
+            if header:
+                st.markdown(f'<div class="response-header">{header}</div>', 
+                          unsafe_allow_html=True)
+            st.markdown(f'<div class="response-content">{content}</div>', 
+                      unsafe_allow_html=True)
+
+    def _run_llm(self, messages, area, header, prefix=""):
+        """Get the LLM response, streaming it into area when streaming is enabled"""
+        if not st.session_state.get('streaming', False):
+            return get_llm_response(messages)
+
+        content = ""
+        for chunk in stream_llm_response(messages):
+            content += chunk
+            self._render_response(area, header, prefix + content)
+        return content
+
     def render(self):
         # At the start of render, ensure PDF document is loaded if bytes exist
         if (st.session_state.presentation_state['pdf_bytes'] is not None and 
@@ -77,11 +204,20 @@ class PresentationAssistant:
                 stream=st.session_state.presentation_state['pdf_bytes'], 
                 filetype="pdf"
             )
+            st.session_state.presentation_state['pdf_hash'] = pdf_hash(
+                st.session_state.presentation_state['pdf_bytes']
+            )
             # Restore the previous page number when reloading document
             current_page = st.session_state.presentation_state['current_page']
             if current_page >= 0:
                 st.session_state.presentation_state['current_page'] = current_page
 
+        if (st.session_state.presentation_state['pdf_bytes'] is not None and
+            st.session_state.presentation_state['pdf_hash'] is None):
+            st.session_state.presentation_state['pdf_hash'] = pdf_hash(
+                st.session_state.presentation_state['pdf_bytes']
+            )
+
         # Create three columns with adjusted ratio first
         left_col, spacer_col, right_col = st.columns([1.2, 0.2, 1.2])
         
@@ -97,15 +233,16 @@ class PresentationAssistant:
                 
                 # Handle file upload
                 if uploaded_file is not None:
-                    pdf_bytes = uploaded_file.getvalue()
-                    st.session_state.presentation_state['pdf_bytes'] = pdf_bytes
-                    st.session_state.presentation_state['pdf_document'] = fitz.open(
-                        stream=pdf_bytes, 
-                        filetype="pdf"
-                    )
-                    
-                    # Only reset page to 0 if it's a new file upload
+                    # Only reopen and rehash the PDF when a new file arrives,
+                    # not on every rerun
                     if st.session_state.presentation_state['uploaded_file'] != uploaded_file:
+                        pdf_bytes = uploaded_file.getvalue()
+                        st.session_state.presentation_state['pdf_bytes'] = pdf_bytes
+                        st.session_state.presentation_state['pdf_hash'] = pdf_hash(pdf_bytes)
+                        st.session_state.presentation_state['pdf_document'] = fitz.open(
+                            stream=pdf_bytes, 
+                            filetype="pdf"
+                        )
                         st.session_state.presentation_state['current_page'] = 0
                         
                     st.session_state.presentation_state['uploaded_file'] = uploaded_file
@@ -126,7 +263,8 @@ class PresentationAssistant:
                         page_range = st.text_input(
                             "Enter page numbers (e.g., 1,2,3 or 1-5)",
                             label_visibility="collapsed",
-                            help="Specify individual pages with commas (1,2,3) or a range with hyphen (1-5)"
+                            placeholder="All pages",
+                            help="Specify individual pages with commas (1,2,3) or a range with hyphen (1-5), or leave empty for the whole deck"
                         )
                         if page_range:
                             try:
@@ -137,16 +275,23 @@ class PresentationAssistant:
                                         selected_pages.update(range(start, end + 1))
                                     else:
                                         selected_pages.add(int(part))
-                                    # Store selected pages in session state
-                                    st.session_state.presentation_state['selected_pages'] = sorted(list(selected_pages))
+                                # Store valid pages in session state
+                                valid_pages = sorted(
+                                    p for p in selected_pages if 1 <= p <= pdf_document.page_count
+                                )
+                                if not valid_pages:
+                                    st.error(f"No valid pages selected. This deck has pages 1 to {pdf_document.page_count}.")
+                                # None marks an unusable selection, never the whole deck
+                                st.session_state.presentation_state['selected_pages'] = valid_pages or None
                             except ValueError:
                                 st.error("Invalid page format. Please use numbers separated by commas or ranges with hyphens.")
-                            else:
-                                # Clear selected pages if input is empty
-                                st.session_state.presentation_state['selected_pages'] = []
+                                st.session_state.presentation_state['selected_pages'] = None
                         else:
-                            # Clear selected pages if multi_page is unchecked
+                            # Empty input analyzes the whole deck
                             st.session_state.presentation_state['selected_pages'] = []
+                    else:
+                        # Clear selected pages if multi_page is unchecked
+                        st.session_state.presentation_state['selected_pages'] = []
                 
                 # Navigation buttons in a row
                 nav_cols = st.columns([0.8, 0.8, 0.8, 0.8, 1.2, 0.8])
@@ -186,17 +331,13 @@ class PresentationAssistant:
 
                 # PDF Viewer below navigation
                 if pdf_document.page_count > 0:
-                    page = pdf_document[current_page]
-                    pix = page.get_pixmap()
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    
-                    # Calculate aspect ratio and resize if needed
-                    max_height = 800  # Maximum height in pixels
-                    if img.height > max_height:
-                        aspect_ratio = img.width / img.height
-                        new_height = max_height
-                        new_width = int(max_height * aspect_ratio)
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    # Served from the render cache, neighbouring pages are
+                    # prefetched in the background
+                    img = get_page_cache().get(
+                        st.session_state.presentation_state['pdf_hash'],
+                        st.session_state.presentation_state['pdf_bytes'],
+                        current_page
+                    )
                     
                     st.markdown('<div class="pdf-viewer-container">', unsafe_allow_html=True)
                     st.image(img, use_column_width=True)
@@ -214,48 +355,47 @@ class PresentationAssistant:
                 with col1:
                     analysis_type = st.selectbox(
                         "Select predefined analysis:",
-                        ["Select Predefined Analysis...", 
-                         "Summarize", 
-                         "Check Numbers", 
-                         "Critique and Reword", 
-                         "Prepare Q&A", 
-                         "Draft Speaker Notes",
-                         "What is not obvious?"],
+                        ["Select Predefined Analysis...", *self.ANALYSIS_PROMPTS],
                         key="analysis_dropdown",
                         label_visibility="collapsed"
                     )
                 with col2:
                     run_analysis = st.button("Run", type="primary")
 
+                # Single placeholder for the response so streamed tokens and
+                # the final result render in the same place
+                response_area = st.empty()
+
                 # Handle analysis when Run button is clicked
-                if run_analysis and analysis_type != "Select Predefined Analysis...":
+                if (run_analysis and analysis_type != "Select Predefined Analysis..." and multi_page
+                        and st.session_state.presentation_state['selected_pages'] is None):
+                    st.error("Fix the page selection before running a batch analysis.")
+                elif run_analysis and analysis_type != "Select Predefined Analysis..." and multi_page:
+                    pages = [p - 1 for p in st.session_state.presentation_state['selected_pages']]
+                    pages = pages or list(range(pdf_document.page_count))
+                    try:
+                        report = self._run_batch(analysis_type, pages, response_area)
+                        st.session_state.current_analysis = {
+                            'type': f"{analysis_type} - {len(pages)} slides",
+                            'content': report
+                        }
+                    except Exception as e:
+                        print(f"\nError occurred: {str(e)}")
+                        st.session_state.current_analysis = {
+                            'type': 'Error',
+                            'content': f"Error in {analysis_type}: {str(e)}"
+                        }
+                elif run_analysis and analysis_type != "Select Predefined Analysis...":
                     # Get the actual displayed page number (add 1 since current_page is 0-based)
                     displayed_page = st.session_state.presentation_state['current_page'] + 1
                     with st.spinner(f"Running {analysis_type} on page {displayed_page}..."):
                         try:
-                            # Image handling for Vision API
-                            img_base64 = self._encode_image_base64(img)
-
-                            # Create message structure based on analysis type
-                            prompt = None
-                            if analysis_type == "Check Numbers":
-                                prompt = NUMERICAL_ANALYSIS_PROMPT
-                            elif analysis_type == "Critique and Reword":
-                                prompt = CRITIQUE_ANALYSIS_PROMPT
-                            elif analysis_type == "Prepare Q&A":
-                                prompt = PRESENTATION_QA_PROMPT
-                            elif analysis_type == "Draft Speaker Notes":
-                                prompt = PRESENTATION_NOTES_PROMPT
-                            elif analysis_type == "What is not obvious?":
-                                prompt = PRESENTATION_WHAT_IS_NOT_OBVIOUS_PROMPT
-                            elif analysis_type == "Summarize":
-                                prompt = PRESENTATION_SUMMARIZE_PROMPT
-    
+                            prompt = self.ANALYSIS_PROMPTS.get(analysis_type)
                             if prompt is None:
                                 raise ValueError(f"Invalid analysis type: {analysis_type}")
 
-                            messages = self.create_message_with_image(prompt, img_base64)
-                            analysis_result = get_llm_response(messages)
+                            messages = self._page_messages(prompt)
+                            analysis_result = self._run_llm(messages, response_area, analysis_type)
                             st.session_state.current_analysis = {
                                 'type': analysis_type,
                                 'content': analysis_result
@@ -274,17 +414,17 @@ class PresentationAssistant:
                     displayed_page = st.session_state.presentation_state['current_page'] + 1
                     with st.spinner(f"Processing user question on page {displayed_page}..."):
                         try:
-                            # Image handling for Vision API
-                            img_base64 = self._encode_image_base64(img)
-
-                            # Create message structure exactly as OpenAI expects
-                            messages = self.create_message_with_image(
-                                f"Please analyze this slide and answer the following question: {user_question}",
-                                img_base64
+                            messages = self._page_messages(
+                                f"Please analyze this slide and answer the following question: {user_question}"
                             )
 
                             # Get LLM response
-                            analysis_result = get_llm_response(messages)
+                            analysis_result = self._run_llm(
+                                messages,
+                                response_area,
+                                'Q&A Response',
+                                prefix=f"Q: {user_question}\n\nA: "
+                            )
                             st.session_state.current_analysis = {
                                 'type': 'Q&A Response',
                                 'content': f"Q: {user_question}\n\nA: {analysis_result}"
@@ -298,13 +438,17 @@ class PresentationAssistant:
 
                 # Response container with adjusted styling
                 if st.session_state.current_analysis:
-                    st.markdown(f'<div class="response-header">{st.session_state.current_analysis["type"]}</div>', 
-                              unsafe_allow_html=True)
-                    st.markdown(f'<div class="response-content">{st.session_state.current_analysis["content"]}</div>', 
-                              unsafe_allow_html=True)
+                    self._render_response(
+                        response_area,
+                        st.session_state.current_analysis["type"],
+                        st.session_state.current_analysis["content"]
+                    )
                 else:
-                    st.markdown('<div class="response-content">Select an analysis tool above or type a question to see results here.</div>', 
-                              unsafe_allow_html=True)
+                    self._render_response(
+                        response_area,
+                        None,
+                        "Select an analysis tool above or type a question to see results here."
+                    )
             #else:
                 #st.info("Analysis tools will appear here after uploading a PDF.")
 
@@ -321,6 +465,7 @@ class PresentationAssistant:
             
             pdf_bytes = st.session_state.presentation_pdf.getvalue()
             st.session_state.presentation_state['pdf_bytes'] = pdf_bytes
+            st.session_state.presentation_state['pdf_hash'] = pdf_hash(pdf_bytes)
             st.session_state.presentation_state['pdf_document'] = fitz.open(
                 stream=pdf_bytes, 
                 filetype="pdf"
@@ -335,3 +480,6 @@ class PresentationAssistant:
                 
             st.session_state.presentation_state['uploaded_file'] = st.session_state.presentation_pdf
 
+
+def show_presentation():
+    PresentationAssistant().render()
@@ -1,68 +1,202 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
 from typing import List, Dict, Optional
 from datetime import datetime
 
+# Weight of a query token found in each episode field when ranking
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'Discussed Topics': 2.0,
+    'subtitle': 1.0,
+}
+# Order the fields are joined in for substring search
+TEXT_FIELDS = ('title', 'subtitle', 'Discussed Topics')
+
+def _normalize(text) -> str:
+    """Collapsed whitespace, only used for trigram keys"""
+    return ' '.join(text.split())
+
+def _tokens(text) -> List[str]:
+    return re.findall(r'[a-z0-9]+', str(text or '').lower())
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
 class PodcastMemory:
+    """
+    Episode lists per podcast with indexes built once at store time:
+    trigram indexes over titles and over the searchable text (title,
+    subtitle and discussed topics) for substring matching, and an inverted
+    token index used to rank whole-word matches. Lookups touch only the
+    posting lists of the query's trigrams instead of scanning every stored
+    episode. Trigrams are taken over whitespace-collapsed text, which any
+    substring of the text still matches; candidates are then confirmed
+    with a plain case-insensitive substring check.
+    """
+
     def __init__(self):
         self.episode_lists: Dict[str, List[Dict]] = {}
         self.last_updated: Dict[str, str] = {}
-        
+        self._lock = threading.RLock()
+        self._clear_indexes()
+
+    def _clear_indexes(self):
+        self._docs: Dict[int, Dict] = {}  # doc id -> {'podcast_name', 'episode', 'title', 'text'}
+        self._podcast_docs: Dict[str, List[int]] = {}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)  # token -> doc id -> weight
+        self._title_trigrams: Dict[str, set] = defaultdict(set)  # trigram -> doc ids
+        self._text_trigrams: Dict[str, set] = defaultdict(set)  # trigram -> doc ids
+        self._next_id = 0
+
+    def _index(self, podcast_name: str, episode: Dict) -> int:
+        doc_id = self._next_id
+        self._next_id += 1
+        fields = {field: str(episode.get(field, '')).lower() for field in TEXT_FIELDS}
+        title = fields['title']
+        self._docs[doc_id] = {
+            'podcast_name': podcast_name,
+            'episode': episode,
+            'title': title,
+            'fields': fields,
+            'text': ' '.join(fields[field] for field in TEXT_FIELDS),
+        }
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in set(_tokens(episode.get(field, ''))):
+                postings = self._postings[token]
+                postings[doc_id] = postings.get(doc_id, 0.0) + weight
+        for trigram in _trigrams(_normalize(title)):
+            self._title_trigrams[trigram].add(doc_id)
+        for trigram in _trigrams(_normalize(self._docs[doc_id]['text'])):
+            self._text_trigrams[trigram].add(doc_id)
+        return doc_id
+
+    def _unindex(self, doc_id: int):
+        doc = self._docs.pop(doc_id)
+        episode = doc['episode']
+        for field in FIELD_WEIGHTS:
+            for token in set(_tokens(episode.get(field, ''))):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[token]
+        for trigrams, index in (
+            (_trigrams(_normalize(doc['title'])), self._title_trigrams),
+            (_trigrams(_normalize(doc['text'])), self._text_trigrams),
+        ):
+            for trigram in trigrams:
+                ids = index.get(trigram)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del index[trigram]
+
     def store_episodes(self, podcast_name: str, episodes: List[Dict]):
         """Store episodes for a specific podcast."""
-        self.episode_lists[podcast_name] = episodes
-        self.last_updated[podcast_name] = datetime.now().isoformat()
-        
+        with self._lock:
+            for doc_id in self._podcast_docs.pop(podcast_name, []):
+                self._unindex(doc_id)
+            self.episode_lists[podcast_name] = episodes
+            self.last_updated[podcast_name] = datetime.now().isoformat()
+            self._podcast_docs[podcast_name] = [self._index(podcast_name, ep) for ep in episodes]
+
     def get_episodes(self, podcast_name: str) -> Optional[List[Dict]]:
         """Retrieve episodes for a specific podcast."""
         return self.episode_lists.get(podcast_name)
-    
+
+    def find_episodes_by_title(self, title: str, podcast_name: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        """
+        Episodes whose title contains title (case-insensitive), optionally
+        within one podcast. Exact titles rank first, then the shortest
+        titles, i.e. those the query covers most of.
+        """
+        query = title.lower()
+        with self._lock:
+            candidates = self._substring_candidates(query, self._title_trigrams, podcast_name)
+            matches = [
+                self._docs[d] for d in candidates
+                if (podcast_name is None or self._docs[d]['podcast_name'] == podcast_name)
+                and query in self._docs[d]['title']
+            ]
+        matches.sort(key=lambda doc: (doc['title'] != query, len(doc['title'])))
+        return [{'podcast_name': doc['podcast_name'], **doc['episode']} for doc in matches[:limit]]
+
+    def _substring_candidates(self, query: str, index: Dict[str, set], podcast_name: Optional[str] = None) -> set:
+        """Doc ids that may contain query, to be confirmed with a substring check"""
+        query = _normalize(query)
+        if len(query) < 3:
+            # Too short for trigrams, the podcast's own episodes are scanned
+            names = [podcast_name] if podcast_name else list(self._podcast_docs)
+            return {d for name in names for d in self._podcast_docs.get(name, [])}
+        # A substring's trigrams all occur in the text, intersect smallest first
+        postings = sorted((index.get(t, set()) for t in _trigrams(query)), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                break
+        return candidates
+
     def get_episode_by_title(self, podcast_name: str, title: str) -> Optional[Dict]:
         """Find a specific episode by title."""
-        episodes = self.get_episodes(podcast_name)
-        if not episodes:
+        matches = self.find_episodes_by_title(title, podcast_name, limit=1)
+        if not matches:
             return None
-        
-        # Case-insensitive partial match
-        title = title.lower()
-        for episode in episodes:
-            if title in episode.get('title', '').lower():
-                return episode
-        return None
-    
-    def search_episodes(self, query: str) -> List[Dict]:
-        """Search across all stored episodes."""
-        results = []
-        query = query.lower()
-        
-        for podcast_name, episodes in self.episode_lists.items():
-            for episode in episodes:
-                # Search in title, subtitle, and discussed topics
-                searchable_text = ' '.join([
-                    str(episode.get('title', '')),
-                    str(episode.get('subtitle', '')),
-                    str(episode.get('Discussed Topics', ''))
-                ]).lower()
-                
-                if query in searchable_text:
-                    results.append({
-                        'podcast_name': podcast_name,
-                        **episode
-                    })
-        
-        return results
-    
+        match = dict(matches[0])
+        match.pop('podcast_name')
+        return match
+
+    def search_episodes(self, query: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Search across all stored episodes for those whose title, subtitle
+        or discussed topics contain the query (case-insensitive), best
+        matches first: by the weight of the fields containing it, then by
+        whole-word matches, so "pod" finds "podcasting" but ranks an
+        episode about "pod" racing higher.
+        """
+        phrase = query.lower()
+        tokens = set(_tokens(query))
+
+        with self._lock:
+            scored = []
+            for doc_id in self._substring_candidates(phrase, self._text_trigrams):
+                doc = self._docs[doc_id]
+                if phrase not in doc['text']:
+                    continue
+                score = sum(
+                    FIELD_WEIGHTS[field] for field, text in doc['fields'].items() if phrase in text
+                )
+                score += sum(self._postings.get(t, {}).get(doc_id, 0.0) for t in tokens)
+                scored.append((score, doc_id))
+            if limit is not None:
+                scored = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+            else:
+                scored.sort(key=lambda item: (-item[0], item[1]))
+            return [
+                {'podcast_name': self._docs[d]['podcast_name'], **self._docs[d]['episode']}
+                for _, d in scored
+            ]
+
     def get_all_podcasts(self) -> List[str]:
         """Get list of all stored podcast names."""
         return list(self.episode_lists.keys())
-    
+
     def clear_podcast(self, podcast_name: str):
         """Clear stored episodes for a specific podcast."""
-        self.episode_lists.pop(podcast_name, None)
-        self.last_updated.pop(podcast_name, None)
-    
+        with self._lock:
+            for doc_id in self._podcast_docs.pop(podcast_name, []):
+                self._unindex(doc_id)
+            self.episode_lists.pop(podcast_name, None)
+            self.last_updated.pop(podcast_name, None)
+
     def clear_all(self):
         """Clear all stored episodes."""
-        self.episode_lists.clear()
-        self.last_updated.clear()
+        with self._lock:
+            self.episode_lists.clear()
+            self.last_updated.clear()
+            self._clear_indexes()
 
 # Create a global instance
 podcast_memory = PodcastMemory()
@@ -0,0 +1,157 @@
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches policy answers by the embedding of the standalone question.
+    Entries live in scopes (a fingerprint of the selected documents'
+    content and the index), so an answer is only reused for the same
+    documents and becomes unreachable once any of them change. A question
+    is answered from the cache when it matches a cached one word for word
+    (ignoring case and punctuation), or when the embeddings are at least
+    threshold similar and both use the same words, so a reworded question
+    that adds "not" or changes a number is never served the other answer.
+    Persisted as append-only JSONL, compacted once it holds twice as many
+    lines as the cache.
+    """
+
+    def __init__(self, path, threshold=0.98, max_entries=5000, evict_fraction=0.1):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # Eviction drops this share of the cache at once so it runs rarely
+        self.evict_fraction = evict_fraction
+        self._scopes = {}  # scope -> {"vectors": ndarray, "size": int, "entries": [dict], "questions": {}}
+        self._count = 0
+        self._logged = 0  # lines in the log, live or not
+        self._lock = threading.Lock()  # in-memory scopes
+        self._file_lock = threading.Lock()  # the log; when both are needed it is taken first
+        self._load()
+
+    @staticmethod
+    def _words(question):
+        return re.findall(r"[a-z0-9]+", question.lower())
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _insert(self, entry):
+        vector = self._normalize(entry["vector"])
+        scope = self._scopes.get(entry["scope"])
+        if scope is None:
+            scope = self._scopes[entry["scope"]] = {
+                "vectors": np.empty((8, vector.shape[0]), dtype=np.float32),
+                "size": 0,
+                "entries": [],
+                "questions": {},  # normalized question -> position
+            }
+        if scope["size"] == len(scope["vectors"]):
+            # Grow geometrically so inserts are amortized O(1)
+            grown = np.empty((2 * len(scope["vectors"]), vector.shape[0]), dtype=np.float32)
+            grown[:scope["size"]] = scope["vectors"][:scope["size"]]
+            scope["vectors"] = grown
+        scope["vectors"][scope["size"]] = vector
+        scope["size"] += 1
+        scope["entries"].append(entry)
+        scope["questions"][" ".join(self._words(entry["question"]))] = scope["size"] - 1
+        self._count += 1
+
+    def _live_entries(self):
+        return sorted(
+            (e for scope in self._scopes.values() for e in scope["entries"]),
+            key=lambda e: e["created"]
+        )
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, 'r') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries[-self.max_entries:]:
+            self._insert(entry)
+        self._logged = len(entries)
+        if len(entries) > self.max_entries:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log down to the live entries, caller holds _file_lock"""
+        with self._lock:
+            entries = self._live_entries()
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        tmp_path.replace(self.path)
+        self._logged = len(entries)
+
+    def lookup(self, vector, scope, question):
+        """Return a cached entry in scope that answers question, or None"""
+        words = self._words(question)
+        with self._lock:
+            cached = self._scopes.get(scope)
+            if cached is None:
+                return None
+            exact = cached["questions"].get(" ".join(words))
+            if exact is not None:
+                return cached["entries"][exact]
+            similarities = cached["vectors"][:cached["size"]] @ self._normalize(vector)
+            # Most similar first, each verified against the question's words
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for i in candidates[np.argsort(-similarities[candidates])]:
+                entry = cached["entries"][int(i)]
+                if set(self._words(entry["question"])) == set(words):
+                    return entry
+            return None
+
+    def store(self, question, vector, scope, filenames, answer, sources):
+        entry = {
+            "question": question,
+            "vector": [float(v) for v in vector],
+            "scope": scope,
+            "filenames": sorted(filenames),
+            "answer": answer,
+            "sources": sources,
+            "created": time.time(),
+        }
+        with self._file_lock:
+            with self._lock:
+                self._insert(entry)
+                if self._count > self.max_entries:
+                    self._evict()
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+            self._logged += 1
+            # Evicted entries stay in the log until it is twice the cache size
+            if self._logged > 2 * self.max_entries:
+                self._compact()
+
+    def _evict(self):
+        """Drop the oldest entries in one batch, leaving room for new ones"""
+        keep = self.max_entries - max(1, int(self.max_entries * self.evict_fraction))
+        entries = self._live_entries()
+        self._scopes, self._count = {}, 0
+        for entry in entries[-keep:] if keep > 0 else []:
+            self._insert(entry)
+
+    def invalidate(self, filenames):
+        """Drop every entry that used any of the given documents"""
+        filenames = set(filenames)
+        with self._file_lock:
+            with self._lock:
+                stale = [
+                    scope for scope, cached in self._scopes.items()
+                    if filenames & set(cached["entries"][0]["filenames"])
+                ]
+                for scope in stale:
+                    self._count -= len(self._scopes.pop(scope)["entries"])
+            if stale:
+                self._compact()
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import anthropic
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+# Connection pool settings shared by every LLM and embedding client
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 100))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 20))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", 60))
+HTTP2_ENABLED = os.getenv("LLM_HTTP2", "1") == "1"
+
+# Providers that speak the OpenAI wire format
+OPENAI_COMPATIBLE = ("OpenAI", "Local")
+
+_http_clients = {}
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return HTTP2_ENABLED
+    except ImportError:
+        return False
+
+
+def default_provider():
+    """Provider for code paths without a sidebar choice (agents, policy, embeddings)"""
+    return os.getenv("LLM_PROVIDER", "OpenAI")
+
+
+def _local_settings():
+    # Imported lazily so the mock server only starts when it's used
+    from utils.local_llm import get_local_base_url
+    return {"base_url": get_local_base_url(), "api_key": "local"}
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+    )
+
+
+def get_http_client(provider):
+    """
+    Long-lived httpx client per provider with keep-alive pooling, so repeated
+    calls reuse open connections instead of paying a new TLS handshake.
+    """
+    with _lock:
+        if provider not in _http_clients:
+            _http_clients[provider] = httpx.Client(
+                http2=_http2_available(),
+                limits=_pool_limits(),
+                timeout=httpx.Timeout(600.0, connect=10.0)
+            )
+        return _http_clients[provider]
+
+
+def get_client(provider, **settings):
+    """Process-wide SDK client for a provider, one per distinct settings"""
+    key = (provider, tuple(sorted(settings.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    http_client = get_http_client(provider)
+    with _lock:
+        if key not in _clients:
+            if provider == "OpenAI":
+                _clients[key] = OpenAI(http_client=http_client, **settings)
+            elif provider == "Local":
+                _clients[key] = OpenAI(http_client=http_client, **dict(_local_settings(), **settings))
+            elif provider == "Anthropic":
+                _clients[key] = anthropic.Anthropic(http_client=http_client, **settings)
+            else:
+                raise ValueError(f"Unknown provider: {provider}")
+        return _clients[key]
+
+
+def get_async_client(provider):
+    """
+    Async SDK client for a provider with its own pooled connections. Async
+    clients are bound to the event loop that first uses them, so only the
+    LLM gateway loop should call this.
+    """
+    with _lock:
+        if provider not in _async_clients:
+            http_client = httpx.AsyncClient(
+                http2=_http2_available(),
+                limits=_pool_limits(),
+                timeout=httpx.Timeout(600.0, connect=10.0)
+            )
+            if provider == "OpenAI":
+                _async_clients[provider] = AsyncOpenAI(http_client=http_client)
+            elif provider == "Local":
+                _async_clients[provider] = AsyncOpenAI(http_client=http_client, **_local_settings())
+            elif provider == "Anthropic":
+                _async_clients[provider] = anthropic.AsyncAnthropic(http_client=http_client)
+            else:
+                raise ValueError(f"Unknown provider: {provider}")
+        return _async_clients[provider]
@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+from utils.metrics import current_context, get_metrics
 
 def initialize_session_state():
     # Global settings
@@ -27,6 +28,10 @@ def get_available_models(provider):
             "claude-3-5-sonnet-20241022": "claude-3-5-sonnet-20241022",
             "claude-3-opus-20240229": "claude-3-opus-20240229",
             "claude-3-haiku-20240307": "claude-3-haiku-20240307"
+        },
+        # Offline mock server for load testing, see utils/local_llm.py
+        "Local": {
+            "local-mock": "local-mock"
         }
     }
     return models.get(provider, {})
@@ -36,10 +41,11 @@ def sidebar():
         st.title("Configuration")
         
         # Provider selection
+        providers = ["OpenAI", "Anthropic", "Local"]
         provider = st.selectbox(
             "Select Provider",
-            ["OpenAI", "Anthropic"],
-            index=0 if st.session_state.provider == "OpenAI" else 1,
+            providers,
+            index=providers.index(st.session_state.provider) if st.session_state.provider in providers else 0,
             key="provider_select",
             help="Choose the AI provider for responses"
         )
@@ -91,8 +97,13 @@ def sidebar():
             st.session_state.streaming = streaming
             
         # Token usage metric with tooltip
+        session, _ = current_context()
+        totals = get_metrics().session_totals(session)
+        st.session_state.token_usage = totals["input_tokens"] + totals["output_tokens"]
         st.metric(
             "Token Usage",
             f"{st.session_state.token_usage:,}",
             help="Total tokens used across all operations"
-        )
\ No newline at end of file
+        )
+        st.caption(f"Estimated cost: ${totals['cost_usd']:.4f} "
+                   f"({totals['cached_tokens']:,} cached input tokens)")
\ No newline at end of file
@@ -1,4 +1,212 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import openai
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 
-def get_embeddings():
-    return OpenAIEmbeddings() 
\ No newline at end of file
+from utils.clients import default_provider, get_http_client
+from utils.metrics import current_context, get_metrics
+from utils.tokens import count_tokens
+
+EMBEDDING_CACHE_PATH = Path("data/vectorstore/embedding_cache")
+
+# Scheduler defaults, override through the environment to match the account quota
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 50_000))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 512))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", 3_000))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", 1_000_000))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._calls = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Block until a request of the given size fits in the budget"""
+        # A single request larger than the whole budget can never fit
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0][0] >= 60:
+                    self._tokens -= self._calls.popleft()[1]
+                if (len(self._calls) < self.requests_per_minute and
+                        self._tokens + tokens <= self.tokens_per_minute):
+                    self._calls.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = 60 - (now - self._calls[0][0])
+            time.sleep(min(max(wait, 0.05), 1.0))
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that packs texts into token-bounded batches, sends
+    several batches at once within a requests/tokens-per-minute budget and
+    retries rate-limited or failed batches with exponential backoff.
+    Throughput of the calling thread's last embed_documents call is kept in
+    last_stats, so concurrent uploads don't overwrite each other's stats.
+    """
+
+    def __init__(self, underlying, provider="OpenAI", max_batch_tokens=EMBEDDING_BATCH_TOKENS,
+                 max_batch_size=EMBEDDING_BATCH_SIZE, max_concurrency=EMBEDDING_CONCURRENCY,
+                 requests_per_minute=EMBEDDING_RPM, tokens_per_minute=EMBEDDING_TPM,
+                 max_retries=6):
+        self.underlying = underlying
+        # Provider the calls are billed to in the metrics
+        self.provider = provider
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._local = threading.local()
+
+    @property
+    def last_stats(self):
+        return getattr(self._local, 'stats', {})
+
+    @property
+    def model(self):
+        return self.underlying.model
+
+    def _batches(self, texts):
+        """Yield (indices, token_count) groups within the batch limits"""
+        batch, batch_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or
+                          len(batch) >= self.max_batch_size):
+                yield batch, batch_tokens
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch, batch_tokens
+
+    def _with_retries(self, fn, tokens, on_retry=None):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                # Respect the server's hint when it gives one
+                delay = None
+                response = getattr(e, 'response', None)
+                if response is not None:
+                    retry_after = response.headers.get("retry-after")
+                    if retry_after:
+                        try:
+                            delay = float(retry_after)
+                        except ValueError:
+                            delay = None
+                if delay is None:
+                    delay = min(2 ** attempt, 60) + random.uniform(0, 1)
+                print(f"\nEmbedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                if on_retry is not None:
+                    on_retry()
+                time.sleep(delay)
+
+    def _record(self, tokens, latency, context=None):
+        get_metrics().record(self.provider, self.model, "embedding", tokens, latency=latency, context=context)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        # Local to this call, its batches update it from worker threads
+        stats = {'retries': 0}
+        stats_lock = threading.Lock()
+        vectors = [None] * len(texts)
+        # Batches run in worker threads, keep them attributed to the caller
+        context = current_context()
+
+        def count_retry():
+            with stats_lock:
+                stats['retries'] += 1
+
+        def run_batch(indices, tokens):
+            batch = [texts[i] for i in indices]
+            batch_start = time.perf_counter()
+            result = self._with_retries(lambda: self.underlying.embed_documents(batch), tokens, count_retry)
+            self._record(tokens, time.perf_counter() - batch_start, context)
+            for i, vector in zip(indices, result):
+                vectors[i] = vector
+
+        batches = list(self._batches(texts))
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for future in [pool.submit(run_batch, indices, tokens) for indices, tokens in batches]:
+                future.result()
+
+        elapsed = time.perf_counter() - start
+        stats.update({
+            'chunks': len(texts),
+            'batches': len(batches),
+            'seconds': elapsed,
+            'chunks_per_second': len(texts) / elapsed if elapsed > 0 else 0.0,
+        })
+        self._local.stats = stats
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        tokens = count_tokens(text)
+        vector = self._with_retries(lambda: self.underlying.embed_query(text), tokens)
+        self._record(tokens, time.perf_counter() - start)
+        return vector
+
+
+def get_embeddings(provider=None):
+    # Retries are handled by the scheduler, not the OpenAI client
+    if (provider or default_provider()) == "Local":
+        from utils.local_llm import get_local_base_url
+        return ScheduledEmbeddings(OpenAIEmbeddings(
+            model="local-embedding",
+            base_url=get_local_base_url(),
+            api_key="local",
+            check_embedding_ctx_length=False,
+            max_retries=0,
+            http_client=get_http_client("Local")
+        ), provider="Local")
+    # Anthropic has no embeddings API, everything else embeds with OpenAI
+    return ScheduledEmbeddings(OpenAIEmbeddings(
+        max_retries=0,
+        http_client=get_http_client("OpenAI")
+    ), provider="OpenAI")
+
+def get_cached_embeddings(cache_path=EMBEDDING_CACHE_PATH, provider=None):
+    """
+    Wrap the embedding model with an on-disk cache keyed by a hash of the
+    chunk text, namespaced by model so switching models never mixes vectors.
+    Unchanged chunks of re-uploaded or revised documents are never re-embedded.
+    """
+    underlying = get_embeddings(provider)
+    store = LocalFileStore(str(cache_path))
+    return CacheBackedEmbeddings.from_bytes_store(
+        underlying,
+        store,
+        namespace=underlying.model
+    )
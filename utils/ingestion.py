@@ -0,0 +1,130 @@
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import docx2txt
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+from utils.metrics import current_context, metrics_context
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.docx')
+
+
+def parse_file(filename, data):
+    """
+    Extract (page, text) pairs from uploaded bytes without touching disk.
+    Runs inside a worker process, so it only uses picklable arguments.
+    """
+    if filename.endswith('.pdf'):
+        reader = PdfReader(io.BytesIO(data))
+        return [(i, page.extract_text() or "") for i, page in enumerate(reader.pages)]
+    elif filename.endswith('.txt'):
+        return [(None, data.decode('utf-8', errors='replace'))]
+    elif filename.endswith('.docx'):
+        return [(None, docx2txt.process(io.BytesIO(data)))]
+    raise ValueError(f"Unsupported file type: {filename}")
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool(max_workers=None):
+    """
+    Process pool for parsing, shared by every upload in the process. Workers
+    are spawned rather than forked: forking the multi-threaded server while
+    another thread holds a lock (logging, sqlite, the HTTP pool) can
+    deadlock the child.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        # A worker that died takes the whole pool down, start a fresh one
+        if _parse_pool is None or getattr(_parse_pool, "_broken", False):
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+class IngestionPipeline:
+    """
+    Parses uploads in the shared process pool and embeds each file in a
+    thread as soon as it is parsed, so embedding the first file overlaps with
+    parsing the rest. Results are yielded per file in completion order.
+    max_workers sizes the process pool when it is first started.
+    """
+
+    def __init__(self, text_splitter, embeddings, max_workers=None, embed_workers=2):
+        self.text_splitter = text_splitter
+        self.embeddings = embeddings
+        self.max_workers = max_workers
+        self.embed_workers = embed_workers
+        self.last_stats = {}
+
+    def _split(self, filename, pages):
+        documents = []
+        for page, text in pages:
+            metadata = {'source': filename, 'filename': filename}
+            if page is not None:
+                metadata['page'] = page
+            documents.append(Document(page_content=text, metadata=metadata))
+        return self.text_splitter.split_documents(documents)
+
+    def _embed(self, filename, pages, context):
+        split_docs = self._split(filename, pages)
+        with metrics_context(context):
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in split_docs])
+        return split_docs, vectors
+
+    def run(self, files):
+        """
+        Yield (filename, split_docs, vectors, error) for each file as soon as
+        it has been parsed and embedded. error is None on success.
+        """
+        files = list(files)
+        if not files:
+            return
+        start = time.perf_counter()
+        chunks = 0
+        context = current_context()
+
+        parse_pool = get_parse_pool(self.max_workers)
+        with ThreadPoolExecutor(max_workers=self.embed_workers) as embed_pool:
+            parsing = {
+                parse_pool.submit(parse_file, file.name, file.getvalue()): file.name
+                for file in files
+            }
+            embedding = {}
+
+            while parsing or embedding:
+                done, _ = wait(list(parsing) + list(embedding), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in parsing:
+                        filename = parsing.pop(future)
+                        try:
+                            pages = future.result()
+                        except Exception as e:
+                            yield filename, None, None, e
+                            continue
+                        embedding[embed_pool.submit(self._embed, filename, pages, context)] = filename
+                    else:
+                        filename = embedding.pop(future)
+                        try:
+                            split_docs, vectors = future.result()
+                        except Exception as e:
+                            yield filename, None, None, e
+                            continue
+                        chunks += len(split_docs)
+                        yield filename, split_docs, vectors, None
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            'files': len(files),
+            'chunks': chunks,
+            'seconds': elapsed,
+            'chunks_per_second': chunks / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,124 @@
+import json
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+# Keeps clause numbers ("4.2.1"), hyphenated terms and acronyms as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[.\-/]")
+
+
+def _with_parts(tokens):
+    """Each token followed by its parts when it is a compound"""
+    for token in tokens:
+        yield token
+        parts = PART_PATTERN.split(token)
+        if len(parts) > 1:
+            yield from parts
+
+
+def tokenize(text):
+    """
+    Compounds ("aml/kyc", "e-mail", "4.2.1", "section-5") are emitted whole
+    and as their parts, so the exact compound ranks highest while a query
+    for one part ("kyc", "section") still matches.
+    """
+    return list(_with_parts(TOKEN_PATTERN.findall(text.lower())))
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked lists of ids into one, best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """
+    Local BM25 inverted index over policy chunks, keyed by the FAISS docstore
+    id of each chunk. Additions are appended to a JSONL log next to the FAISS
+    index, so uploads never rewrite it.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}
+        self.doc_files = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        index = cls(path, **kwargs)
+        if index.path.exists():
+            with open(index.path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        terms = entry["terms"]
+                        if not entry.get("parts"):
+                            # Logged before compounds were split into parts
+                            terms = Counter()
+                            for term, tf in entry["terms"].items():
+                                for token in _with_parts([term]):
+                                    terms[token] += tf
+                        index._index(entry["id"], entry["filename"], terms)
+        return index
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def _index(self, doc_id, filename, terms):
+        if doc_id in self.doc_lengths:
+            return
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_files[doc_id] = filename
+        self.total_length += length
+
+    def add(self, chunks):
+        """Index and persist (doc_id, text, filename) tuples"""
+        entries = []
+        for doc_id, text, filename in chunks:
+            entries.append({
+                "id": doc_id,
+                "filename": filename,
+                "terms": dict(Counter(tokenize(text))),
+                "parts": True,
+            })
+        with self._lock:
+            for entry in entries:
+                self._index(entry["id"], entry["filename"], entry["terms"])
+            with open(self.path, 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+
+    def search(self, query, k=4, filenames=None):
+        """Return the ids of the top k chunks, optionally limited to files"""
+        allowed = set(filenames) if filenames is not None else None
+        scores = {}
+        with self._lock:
+            num_docs = len(self.doc_lengths)
+            if not num_docs:
+                return []
+            avg_length = self.total_length / num_docs
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and self.doc_files.get(doc_id) not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from utils.clients import OPENAI_COMPATIBLE, default_provider, get_async_client, get_client
+from utils.metrics import current_context, get_metrics
+
+# Maximum concurrent upstream requests per provider
+CONCURRENCY_LIMITS = {
+    "OpenAI": int(os.getenv("LLM_CONCURRENCY_OPENAI", 16)),
+    "Anthropic": int(os.getenv("LLM_CONCURRENCY_ANTHROPIC", 8)),
+    "Local": int(os.getenv("LLM_CONCURRENCY_LOCAL", 64)),
+}
+
+
+def request_key(provider, params):
+    """Stable hash of a request, identical requests share one upstream call"""
+    payload = json.dumps([provider, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMGateway:
+    """
+    Asyncio gateway that every LLM call goes through. It runs its own event
+    loop in a background thread, limits concurrent requests per provider and
+    coalesces identical in-flight requests into a single upstream call.
+    Streamlit code uses the blocking complete() facade.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(CONCURRENCY_LIMITS, **(limits or {}))
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        # Only touched from the gateway loop, so no locking needed
+        self._inflight = {}
+        self._semaphores = {}
+        self.stats = {"requests": 0, "upstream": 0, "coalesced": 0}
+
+    def _semaphore(self, provider):
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.limits.get(provider, 8))
+        return self._semaphores[provider]
+
+    async def _call(self, provider, params):
+        async with self._semaphore(provider):
+            self.stats["upstream"] += 1
+            client = get_async_client(provider)
+            if provider in OPENAI_COMPATIBLE:
+                return await client.chat.completions.create(**params)
+            elif provider == "Anthropic":
+                return await client.messages.create(**params)
+            raise ValueError(f"Unknown provider: {provider}")
+
+    async def _submit(self, provider, params):
+        """Return (response, coalesced) for a request"""
+        self.stats["requests"] += 1
+        key = request_key(provider, params)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._call(provider, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # Shield so one caller giving up doesn't cancel the shared request
+        return await asyncio.shield(task), coalesced
+
+    async def submit(self, provider, **params):
+        """Send a chat request, joining an identical one already in flight"""
+        response, _ = await self._submit(provider, params)
+        return response
+
+    def complete_future(self, provider, **params):
+        """Schedule a request from any thread, returns a Future of the response"""
+        context = current_context()
+        start = time.perf_counter()
+        result = Future()
+
+        def done(future):
+            try:
+                response, coalesced = future.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            # Only the caller that triggered the upstream call is billed for it
+            if not coalesced:
+                get_metrics().record_response(
+                    provider, params.get("model", ""), response,
+                    time.perf_counter() - start, context
+                )
+            result.set_result(response)
+
+        asyncio.run_coroutine_threadsafe(self._submit(provider, params), self.loop).add_done_callback(done)
+        return result
+
+    def complete(self, provider, **params):
+        """Blocking facade for Streamlit script threads"""
+        return self.complete_future(provider, **params).result()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+class _MeteredStream:
+    """
+    Wraps an OpenAI chat stream and records its usage once the final chunk
+    arrives. Usage is only reported when the caller asked for it with
+    stream_options={"include_usage": True} (ChatOpenAI's stream_usage=True).
+    """
+
+    def __init__(self, stream, provider, model, context, start):
+        self._stream = stream
+        self.provider = provider
+        self.model = model
+        self.context = context
+        self.start = start
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if getattr(chunk, "usage", None) is not None:
+                get_metrics().record_response(
+                    self.provider, self.model, chunk,
+                    time.perf_counter() - self.start, self.context
+                )
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+
+class _RawResponse:
+    """Minimal stand-in for the SDK's raw response: parse() and headers"""
+
+    def __init__(self, parsed, headers=None):
+        self._parsed = parsed
+        self.headers = headers or {}
+
+    def parse(self):
+        return self._parsed
+
+
+class _RawResponseCompletions:
+    """client.chat.completions.with_raw_response, used by langchain-openai"""
+
+    def __init__(self, completions):
+        self.completions = completions
+
+    def create(self, **params):
+        completions = self.completions
+        if params.get("stream"):
+            raw = completions.fallback.with_raw_response.create(**params)
+            return _RawResponse(completions._metered(raw.parse(), params), raw.headers)
+        # Coalesced responses have no single set of HTTP headers
+        return _RawResponse(completions.gateway.complete(completions.provider, **params))
+
+
+class _GatewayCompletions:
+    def __init__(self, gateway, provider, fallback):
+        self.gateway = gateway
+        self.provider = provider
+        self.fallback = fallback
+
+    def _metered(self, stream, params):
+        return _MeteredStream(
+            stream, self.provider, params.get("model", ""),
+            current_context(), time.perf_counter()
+        )
+
+    @property
+    def with_raw_response(self):
+        return _RawResponseCompletions(self)
+
+    def create(self, **params):
+        # Streams can't be shared between callers, send them directly
+        if params.get("stream"):
+            return self._metered(self.fallback.create(**params), params)
+        return self.gateway.complete(self.provider, **params)
+
+
+def gateway_openai_client(provider=None):
+    """
+    Minimal stand-in for the OpenAI client that routes chat completions
+    through the gateway. Used by Swarm and LangChain, which only call
+    client.chat.completions.create() and its with_raw_response variant.
+    Streams bypass the gateway but still have their usage recorded.
+
+    Both speak the OpenAI wire format, so a provider that doesn't (e.g.
+    LLM_PROVIDER=Anthropic) falls back to OpenAI rather than handing them
+    a client without chat.completions.
+    """
+    provider = provider or default_provider()
+    if provider not in OPENAI_COMPATIBLE:
+        provider = "OpenAI"
+    completions = _GatewayCompletions(get_gateway(), provider, get_client(provider).chat.completions)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
@@ -1,35 +1,55 @@
 import os
-from openai import OpenAI
-import anthropic
+import queue
+import threading
+import time
 import streamlit as st
+from utils.clients import OPENAI_COMPATIBLE, get_client
+from utils.llm_gateway import get_gateway
+from utils.metrics import current_context, get_metrics, metrics_context, usage_from_response
+from utils.response_cache import get_response_cache, make_key
 
-@st.cache_data(ttl=3600)  # Cache LLM responses for 1 hour
 def get_cached_llm_response(prompt: str, model: str, temperature: float) -> str:
-    if st.session_state.provider == "OpenAI":
-        client = OpenAI()
+    # Persistent cache shared across workers, keyed on the full request
+    provider = st.session_state.provider
+    messages = [{"role": "user", "content": prompt}]
+    cache = get_response_cache()
+    key = make_key(provider, model, messages, temperature, max_tokens=1024)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached["content"], cached["tokens"]
+
+    if provider in OPENAI_COMPATIBLE:
         try:
-            response = client.chat.completions.create(
+            response = get_gateway().complete(
+                provider,
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
                 stream=False  # Disable streaming for cached responses
             )
             content = response.choices[0].message.content
-            return content, response.usage.total_tokens
+            input_tokens, output_tokens, _ = usage_from_response(provider, response)
+            tokens = input_tokens + output_tokens
+            cache.set(key, {"content": content, "tokens": tokens})
+            return content, tokens
         except Exception as e:
-            st.error(f"Error getting OpenAI response: {str(e)}")
+            st.error(f"Error getting {provider} response: {str(e)}")
             return "Sorry, there was an error processing your request.", 0
     
-    elif st.session_state.provider == "Anthropic":
-        client = anthropic.Anthropic()
+    elif provider == "Anthropic":
         try:
-            response = client.messages.create(
+            response = get_gateway().complete(
+                "Anthropic",
                 model=model,
                 max_tokens=1024,
                 temperature=temperature,
                 messages=[{"role": "user", "content": prompt}]
             )
-            return response.content[0].text, len(prompt.split())  # Approximate token count
+            content = response.content[0].text
+            input_tokens, output_tokens, _ = usage_from_response("Anthropic", response)
+            tokens = input_tokens + output_tokens
+            cache.set(key, {"content": content, "tokens": tokens})
+            return content, tokens
         except Exception as e:
             st.error(f"Error getting Anthropic response: {str(e)}")
             return "Sorry, there was an error processing your request.", 0
@@ -39,7 +59,7 @@ def format_messages_for_provider(messages, provider):
     Format messages according to provider's requirements
     """
     if isinstance(messages, str):
-        if provider == "OpenAI":
+        if provider in OPENAI_COMPATIBLE:
             return [{"role": "user", "content": messages}]
         else:  # Anthropic
             return [{
@@ -48,7 +68,7 @@ def format_messages_for_provider(messages, provider):
             }]
     
     # Handle structured messages (including images)
-    if provider == "OpenAI":
+    if provider in OPENAI_COMPATIBLE:
         # OpenAI expects image_url format
         return messages
     else:  # Anthropic
@@ -61,12 +81,13 @@ def format_messages_for_provider(messages, provider):
                         content.append(item)
                     elif item.get("type") == "image_url":
                         # Convert OpenAI image format to Anthropic format
+                        header, _, data = item["image_url"]["url"].partition(";base64,")
                         content.append({
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": "image/png",
-                                "data": item["image_url"]["url"].split("base64,")[1]
+                                "media_type": header[len("data:"):],
+                                "data": data
                             }
                         })
             else:
@@ -78,12 +99,105 @@ def format_messages_for_provider(messages, provider):
             })
         return formatted_messages
 
+def _response_key(messages):
+    return make_key(
+        st.session_state.provider,
+        st.session_state.model,
+        messages,
+        st.session_state.temperature,
+        max_tokens=4096
+    )
+
 def get_llm_response(messages):
+    cache = get_response_cache()
+    key = _response_key(messages)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached["content"]
+
+    content = _get_llm_response(messages)
+    cache.set(key, {"content": content})
+    return content
+
+def get_llm_responses(requests):
+    """
+    Send several requests concurrently through the gateway. Takes
+    (tag, messages) pairs and yields (tag, content, error) as each one
+    finishes. requests is consumed in a background
+    thread, so results stream out while later requests are still being
+    prepared. messages may be the exception raised while preparing them,
+    which is then reported as that request's error.
+    """
+    provider = st.session_state.provider
+    model = st.session_state.model
+    temperature = st.session_state.temperature
+    cache = get_response_cache()
+    gateway = get_gateway()
+    context = current_context()
+    results = queue.Queue()  # (tag, content, error, cache key) or (None, count, error, None) when done
+
+    def complete(future, tag, key):
+        try:
+            response = future.result()
+            if provider in OPENAI_COMPATIBLE:
+                content = response.choices[0].message.content
+            else:  # Anthropic
+                content = response.content[0].text
+        except Exception as e:
+            results.put((tag, None, e, None))
+            return
+        results.put((tag, content, None, key))
+
+    def submit_all():
+        count, failure = 0, None
+        # The session's metrics context doesn't follow into this thread
+        with metrics_context(context):
+            try:
+                for tag, messages in requests:
+                    count += 1
+                    if isinstance(messages, Exception):
+                        results.put((tag, None, messages, None))
+                        continue
+                    key = make_key(provider, model, messages, temperature, max_tokens=4096)
+                    cached = cache.get(key)
+                    if cached is not None:
+                        results.put((tag, cached["content"], None, None))
+                        continue
+                    future = gateway.complete_future(
+                        provider,
+                        model=model,
+                        messages=format_messages_for_provider(messages, provider),
+                        max_tokens=4096,
+                        temperature=temperature
+                    )
+                    future.add_done_callback(lambda f, tag=tag, key=key: complete(f, tag, key))
+            except Exception as e:
+                failure = e
+        results.put((None, count, failure, None))
+
+    threading.Thread(target=submit_all, daemon=True).start()
+    expected, received, failure = None, 0, None
+    while expected is None or received < expected:
+        tag, content, error, key = results.get()
+        if tag is None:
+            expected, failure = content, error
+            continue
+        received += 1
+        if error is not None:
+            print(f"\nAPI Error details: {str(error)}")
+        elif key is not None:
+            cache.set(key, {"content": content})
+        yield tag, content, error
+    if failure is not None:
+        raise failure
+
+def _get_llm_response(messages):
     try:
-        if st.session_state.provider == "OpenAI":
-            client = OpenAI()
-            formatted_messages = format_messages_for_provider(messages, "OpenAI")
-            response = client.chat.completions.create(
+        provider = st.session_state.provider
+        if provider in OPENAI_COMPATIBLE:
+            formatted_messages = format_messages_for_provider(messages, provider)
+            response = get_gateway().complete(
+                provider,
                 model=st.session_state.model,
                 messages=formatted_messages,
                 max_tokens=4096,
@@ -92,9 +206,9 @@ def get_llm_response(messages):
             return response.choices[0].message.content
                 
         elif st.session_state.provider == "Anthropic":
-            client = anthropic.Anthropic()
             formatted_messages = format_messages_for_provider(messages, "Anthropic")
-            response = client.messages.create(
+            response = get_gateway().complete(
+                "Anthropic",
                 model=st.session_state.model,
                 max_tokens=4096,
                 temperature=st.session_state.temperature,
@@ -105,3 +219,62 @@ def get_llm_response(messages):
     except Exception as e:
         print(f"\nAPI Error details: {str(e)}")
         raise Exception(f"Error getting {st.session_state.provider} response: {str(e)}")
+
+def stream_llm_response(messages):
+    """Yield the response text chunk by chunk as the provider generates it"""
+    cache = get_response_cache()
+    key = _response_key(messages)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached["content"]
+        return
+
+    content = ""
+    for chunk in _stream_llm_response(messages):
+        content += chunk
+        yield chunk
+    cache.set(key, {"content": content})
+
+def _stream_llm_response(messages):
+    start = time.perf_counter()
+    try:
+        provider = st.session_state.provider
+        if provider in OPENAI_COMPATIBLE:
+            client = get_client(provider)
+            formatted_messages = format_messages_for_provider(messages, provider)
+            stream = client.chat.completions.create(
+                model=st.session_state.model,
+                messages=formatted_messages,
+                max_tokens=4096,
+                temperature=st.session_state.temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                # The final chunk carries usage for the whole stream
+                if chunk.usage is not None:
+                    get_metrics().record_response(
+                        provider, st.session_state.model, chunk, time.perf_counter() - start
+                    )
+
+        elif st.session_state.provider == "Anthropic":
+            client = get_client("Anthropic")
+            formatted_messages = format_messages_for_provider(messages, "Anthropic")
+            with client.messages.stream(
+                model=st.session_state.model,
+                max_tokens=4096,
+                temperature=st.session_state.temperature,
+                messages=formatted_messages
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+                get_metrics().record_response(
+                    "Anthropic", st.session_state.model, stream.get_final_message(),
+                    time.perf_counter() - start
+                )
+
+    except Exception as e:
+        print(f"\nAPI Error details: {str(e)}")
+        raise Exception(f"Error getting {st.session_state.provider} response: {str(e)}")
@@ -0,0 +1,242 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Vocabulary for generated answers, output is deterministic per prompt
+WORDS = (
+    "policy review risk control limit exposure trading desk client report "
+    "approval process team budget quarter revenue margin market data model "
+    "summary action owner deadline update issue finding evidence governance"
+).split()
+
+
+class LocalLLMConfig:
+    """Behaviour of the mock server, read from LOCAL_LLM_* environment variables"""
+
+    def __init__(self, latency_ms=None, tokens_per_second=None, response_tokens=None,
+                 error_rate=None, embedding_dim=None, seed=None):
+        self.latency_ms = float(latency_ms if latency_ms is not None else os.getenv("LOCAL_LLM_LATENCY_MS", 200))
+        self.tokens_per_second = float(tokens_per_second if tokens_per_second is not None else os.getenv("LOCAL_LLM_TOKENS_PER_SECOND", 50))
+        self.response_tokens = int(response_tokens if response_tokens is not None else os.getenv("LOCAL_LLM_RESPONSE_TOKENS", 64))
+        self.error_rate = float(error_rate if error_rate is not None else os.getenv("LOCAL_LLM_ERROR_RATE", 0))
+        self.embedding_dim = int(embedding_dim if embedding_dim is not None else os.getenv("LOCAL_LLM_EMBEDDING_DIM", 1536))
+        self.seed = int(seed if seed is not None else os.getenv("LOCAL_LLM_SEED", 0))
+
+
+def _count_tokens(messages):
+    """Rough but deterministic prompt size, images count as a fixed tile cost"""
+    tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += len(content.split()) + 4
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "").split())
+            else:
+                tokens += 765
+        tokens += 4
+    return tokens
+
+
+def _generate(messages, model, num_tokens):
+    """Deterministic answer text for a prompt"""
+    digest = hashlib.sha256(json.dumps([model, messages], sort_keys=True, default=str).encode()).hexdigest()
+    rng = random.Random(digest)
+    words = [rng.choice(WORDS) for _ in range(num_tokens)]
+    return f"[local {digest[:8]}] " + " ".join(words)
+
+
+def _embed(text, dim):
+    """Deterministic unit vector for a text"""
+    rng = random.Random(hashlib.sha256(str(text).encode()).hexdigest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def make_handler(config):
+    error_rng = random.Random(config.seed)
+    error_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _inject_error(self):
+            with error_lock:
+                failed = error_rng.random() < config.error_rate
+                rate_limited = error_rng.random() < 0.5
+            if not failed:
+                return False
+            if rate_limited:
+                self._send_json(429, {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error"}},
+                                headers={"Retry-After": "0"})
+            else:
+                self._send_json(500, {"error": {"message": "Server error (injected)", "type": "server_error"}})
+            return True
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "local-mock", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self._inject_error():
+                return
+            if self.path.endswith("/chat/completions"):
+                self._chat(request)
+            elif self.path.endswith("/embeddings"):
+                self._embeddings(request)
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def _chat(self, request):
+            model = request.get("model", "local-mock")
+            messages = request.get("messages", [])
+            num_tokens = min(config.response_tokens, request.get("max_tokens") or config.response_tokens)
+            text = _generate(messages, model, num_tokens)
+            usage = {
+                "prompt_tokens": _count_tokens(messages),
+                "completion_tokens": num_tokens,
+                "total_tokens": _count_tokens(messages) + num_tokens,
+            }
+            completion_id = f"chatcmpl-local-{uuid.uuid4().hex[:12]}"
+            created = int(time.time())
+            delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+            time.sleep(config.latency_ms / 1000)
+            if not request.get("stream"):
+                time.sleep(delay * num_tokens)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            def send(chunk):
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+            def chunk(delta, finish_reason=None):
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+
+            send(chunk({"role": "assistant", "content": ""}))
+            for i, word in enumerate(text.split(" ")):
+                send(chunk({"content": word if i == 0 else " " + word}))
+                time.sleep(delay)
+            send(chunk({}, "stop"))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                final = chunk({})
+                final["choices"] = []
+                final["usage"] = usage
+                send(final)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _embeddings(self, request):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            time.sleep(config.latency_ms / 1000)
+            tokens = sum(len(str(text).split()) for text in inputs)
+            self._send_json(200, {
+                "object": "list",
+                "model": request.get("model", "local-embedding"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": _embed(text, config.embedding_dim)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+    return Handler
+
+
+def start_local_server(port=0, config=None):
+    """Start the mock server in a daemon thread, returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config or LocalLLMConfig()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+_base_url = None
+_lock = threading.Lock()
+
+
+def get_local_base_url():
+    """LOCAL_LLM_URL if set, otherwise an in-process mock server started on first use"""
+    global _base_url
+    with _lock:
+        if _base_url is None:
+            _base_url = os.getenv("LOCAL_LLM_URL")
+            if not _base_url:
+                _, _base_url = start_local_server()
+        return _base_url
+
+
+if __name__ == "__main__":
+    # Run the mock as its own process, e.g. for several app workers:
+    #   python -m utils.local_llm --port 8001
+    #   LLM_PROVIDER=Local LOCAL_LLM_URL=http://127.0.0.1:8001/v1 streamlit run app.py
+    parser = argparse.ArgumentParser(description="Deterministic OpenAI-compatible mock server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--response-tokens", type=int)
+    parser.add_argument("--error-rate", type=float)
+    args = parser.parse_args()
+
+    config = LocalLLMConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate
+    )
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(config))
+    print(f"Local LLM serving on http://0.0.0.0:{args.port}/v1")
+    server.serve_forever()
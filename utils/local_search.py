@@ -0,0 +1,55 @@
+import hashlib
+import random
+import time
+
+# Sources and phrases for generated results, output is deterministic per query
+DOMAINS = ["reuters.com", "ft.com", "bloomberg.com", "wsj.com", "bis.org", "sec.gov", "investopedia.com"]
+PHRASES = (
+    "According to the latest filings", "Analysts expect", "The regulator said",
+    "Market participants noted", "In its quarterly report", "Data released on Tuesday showed",
+)
+
+
+class LocalTavilyClient:
+    """
+    Offline stand-in for TavilyClient with the same search() response shape.
+    Results are deterministic per query and include a duplicate URL, like
+    real search results often do, so deduplication can be exercised.
+    """
+
+    def __init__(self, latency_ms=0, num_results=6):
+        self.latency_ms = latency_ms
+        self.num_results = num_results
+        self.calls = 0
+
+    def search(self, query, max_results=None, **kwargs):
+        self.calls += 1
+        start = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        rng = random.Random(hashlib.sha256(query.encode()).hexdigest())
+        results = []
+        for i in range(max_results or self.num_results):
+            domain = rng.choice(DOMAINS)
+            slug = "-".join(query.lower().split()[:6]) or "result"
+            content = " ".join(
+                f"{rng.choice(PHRASES)} that {query} remains in focus ({rng.randint(1, 99)}%)."
+                for _ in range(rng.randint(3, 12))
+            )
+            results.append({
+                "title": f"{query.title()} - {domain.split('.')[0].upper()} ({i + 1})",
+                "url": f"https://www.{domain}/{slug}-{i}",
+                "content": content,
+                "score": round(1 - i * 0.08, 3),
+                "raw_content": None,
+            })
+        if results:
+            # Same page with a trailing slash and tracking parameter
+            duplicate = dict(results[0], url=results[0]["url"] + "/?utm_source=feed", score=0.5)
+            results.append(duplicate)
+        return {
+            "query": query,
+            "answer": None,
+            "images": [],
+            "results": results,
+            "response_time": time.perf_counter() - start,
+        }
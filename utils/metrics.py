@@ -0,0 +1,247 @@
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per million tokens: (input, output, cached input)
+PRICES = {
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4-turbo": (10.00, 30.00, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50, 0.50),
+    "o1": (15.00, 60.00, 7.50),
+    "o1-mini": (3.00, 12.00, 1.50),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-opus": (15.00, 75.00, 1.50),
+    "claude-3-haiku": (0.25, 1.25, 0.03),
+    "text-embedding-ada-002": (0.10, 0.0, 0.10),
+    "text-embedding-3-small": (0.02, 0.0, 0.02),
+    "text-embedding-3-large": (0.13, 0.0, 0.13),
+}
+
+# Page keys from app.py mapped to reporting features
+FEATURES = {
+    "decks": "Decks",
+    "policy": "Policy",
+    "ask": "Ask",
+}
+
+_local = threading.local()
+
+
+def price_for(model):
+    """Longest matching price entry, so dated model ids resolve to their family"""
+    matches = [name for name in PRICES if model.startswith(name)]
+    return PRICES[max(matches, key=len)] if matches else (0.0, 0.0, 0.0)
+
+
+def cost_for(model, input_tokens, output_tokens=0, cached_tokens=0):
+    """USD cost of a call"""
+    input_price, output_price, cached_price = price_for(model)
+    return (
+        (input_tokens - cached_tokens) * input_price +
+        cached_tokens * cached_price +
+        output_tokens * output_price
+    ) / 1_000_000
+
+
+def usage_from_response(provider, response):
+    """(input, output, cached) tokens from a provider response"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    if provider == "Anthropic":
+        # Anthropic reports cache reads and writes separately from input_tokens
+        cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+        created = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        return usage.input_tokens + cached + created, usage.output_tokens, cached
+    cached = 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None:
+        cached = getattr(details, "cached_tokens", 0) or 0
+    return usage.prompt_tokens, usage.completion_tokens, cached
+
+
+def current_context():
+    """(session_id, feature) of the calling thread"""
+    override = getattr(_local, "context", None)
+    if override is not None:
+        return override
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return ("unknown", "unknown")
+        page = st.session_state.get("page", "unknown")
+        return (ctx.session_id, FEATURES.get(page, page))
+    except Exception:
+        return ("unknown", "unknown")
+
+
+@contextmanager
+def metrics_context(context):
+    """Attribute calls made in worker threads to the caller's session and feature"""
+    previous = getattr(_local, "context", None)
+    _local.context = context
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+
+class MetricsStore:
+    """In-process store of LLM and embedding usage, latency and cost"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (feature, provider, model, kind) -> totals
+        self._sessions = {}  # session -> totals
+        self._hops = {}  # (feature, agent, kind) -> totals, kind is "llm" or "tools"
+
+    @staticmethod
+    def _empty():
+        return {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "latency_seconds": 0.0,
+            "cost_usd": 0.0,
+        }
+
+    def record(self, provider, model, kind, input_tokens, output_tokens=0,
+               cached_tokens=0, latency=0.0, context=None):
+        session, feature = context or current_context()
+        cost = cost_for(model, input_tokens, output_tokens, cached_tokens)
+
+        with self._lock:
+            for totals in (
+                self._series.setdefault((feature, provider, model, kind), self._empty()),
+                self._sessions.setdefault(session, self._empty()),
+            ):
+                totals["requests"] += 1
+                totals["input_tokens"] += input_tokens
+                totals["output_tokens"] += output_tokens
+                totals["cached_tokens"] += cached_tokens
+                totals["latency_seconds"] += latency
+                totals["cost_usd"] += cost
+
+    def record_response(self, provider, model, response, latency, context=None):
+        input_tokens, output_tokens, cached_tokens = usage_from_response(provider, response)
+        self.record(provider, model, "chat", input_tokens, output_tokens,
+                    cached_tokens, latency, context)
+        return input_tokens + output_tokens
+
+    def record_hop(self, agent, kind, latency, model="", input_tokens=0,
+                   output_tokens=0, cached_tokens=0, context=None):
+        """
+        One step of an agent run, either its LLM call or the tool calls that
+        followed. Tokens and cost are already in the request series, this
+        breaks them down per agent.
+        """
+        _, feature = context or current_context()
+        with self._lock:
+            totals = self._hops.setdefault((feature, agent, kind), self._empty())
+            totals["requests"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["latency_seconds"] += latency
+            totals["cost_usd"] += cost_for(model, input_tokens, output_tokens, cached_tokens)
+
+    def session_totals(self, session):
+        with self._lock:
+            return dict(self._sessions.get(session, self._empty()))
+
+    def feature_totals(self):
+        """Totals per feature across all sessions"""
+        features = {}
+        with self._lock:
+            for (feature, _, _, _), totals in self._series.items():
+                merged = features.setdefault(feature, self._empty())
+                for key, value in totals.items():
+                    merged[key] += value
+        return features
+
+    def export_prometheus(self):
+        """Prometheus text exposition format"""
+        families = {
+            "llm_requests_total": ("counter", []),
+            "llm_tokens_total": ("counter", []),
+            "llm_cost_usd_total": ("counter", []),
+            "llm_latency_seconds": ("summary", []),
+        }
+        with self._lock:
+            series = sorted(self._series.items())
+        for (feature, provider, model, kind), totals in series:
+            labels = f'feature="{feature}",provider="{provider}",model="{model}",kind="{kind}"'
+            families["llm_requests_total"][1].append(f"llm_requests_total{{{labels}}} {totals['requests']}")
+            for token_type in ("input", "output", "cached"):
+                families["llm_tokens_total"][1].append(
+                    f'llm_tokens_total{{{labels},type="{token_type}"}} {totals[token_type + "_tokens"]}'
+                )
+            families["llm_cost_usd_total"][1].append(f"llm_cost_usd_total{{{labels}}} {totals['cost_usd']:.6f}")
+            families["llm_latency_seconds"][1].extend([
+                f"llm_latency_seconds_sum{{{labels}}} {totals['latency_seconds']:.6f}",
+                f"llm_latency_seconds_count{{{labels}}} {totals['requests']}",
+            ])
+
+        families.update({
+            "agent_hops_total": ("counter", []),
+            "agent_hop_cost_usd_total": ("counter", []),
+            "agent_hop_latency_seconds": ("summary", []),
+        })
+        with self._lock:
+            hops = sorted(self._hops.items())
+        for (feature, agent, kind), totals in hops:
+            labels = f'feature="{feature}",agent="{agent}",kind="{kind}"'
+            families["agent_hops_total"][1].append(f"agent_hops_total{{{labels}}} {totals['requests']}")
+            families["agent_hop_cost_usd_total"][1].append(f"agent_hop_cost_usd_total{{{labels}}} {totals['cost_usd']:.6f}")
+            families["agent_hop_latency_seconds"][1].extend([
+                f"agent_hop_latency_seconds_sum{{{labels}}} {totals['latency_seconds']:.6f}",
+                f"agent_hop_latency_seconds_count{{{labels}}} {totals['requests']}",
+            ])
+
+        lines = []
+        for name, (metric_type, samples) in families.items():
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsStore()
+            port = os.getenv("METRICS_PORT")
+            if port:
+                start_metrics_server(_metrics, int(port))
+        return _metrics
+
+
+def start_metrics_server(metrics, port):
+    """Serve the Prometheus export on /metrics from a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.export_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,417 @@
+import base64
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import fitz
+from PIL import Image
+
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", 512)) * 1024 * 1024
+PAGE_PREFETCH = int(os.getenv("PAGE_PREFETCH", 2))  # pages ahead, one behind
+DEFAULT_DPI = 72
+
+# Encoded payloads sent to vision models
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()  # JPEG, WEBP or PNG
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", 85))
+PAYLOAD_CACHE_MAX_BYTES = int(os.getenv("PAYLOAD_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+# (longest edge, shortest edge) in pixels that each provider uses before it
+# downscales server side, anything larger only costs upload time and tokens
+VISION_LIMITS = {
+    "OpenAI": (2048, 768),
+    "Local": (2048, 768),
+    "Anthropic": (1568, 1568),
+}
+
+# Text layer thresholds: a slide goes to the vision model when it has little
+# text, when images cover much of it, or when it has many vector shapes
+# outside tables (usually a chart)
+TEXT_MIN_WORDS = int(os.getenv("TEXT_MIN_WORDS", 20))
+TEXT_MAX_IMAGE_COVERAGE = float(os.getenv("TEXT_MAX_IMAGE_COVERAGE", 0.3))
+TEXT_MAX_DRAWINGS = int(os.getenv("TEXT_MAX_DRAWINGS", 40))
+
+# Processes preparing slides for batch analysis, each with its own MuPDF
+BATCH_RENDER_WORKERS = int(os.getenv("DECK_BATCH_RENDER_WORKERS", 4))
+# Decks written to disk so batch workers can open them by path
+DECK_PATH = Path(os.getenv("DECK_PATH", Path(tempfile.gettempdir()) / "caoassist-decks"))
+
+# MuPDF isn't safe to drive from several threads of one process at once, so
+# every in-process render (foreground or prefetch) goes through this lock.
+# Batches render in worker processes instead and never take it.
+_render_lock = threading.Lock()
+
+
+def pdf_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def rasterize_page(pdf_document, page_number, dpi=DEFAULT_DPI, max_height=800):
+    """Render a PDF page to a PIL image no taller than max_height pixels"""
+    page = pdf_document[page_number]
+    pix = page.get_pixmap(dpi=dpi)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    # Calculate aspect ratio and resize if needed
+    if img.height > max_height:
+        aspect_ratio = img.width / img.height
+        new_height = max_height
+        new_width = int(max_height * aspect_ratio)
+        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    return img
+
+
+def encode_image(img, image_format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY):
+    """Encode a PIL image as a base64 data URL"""
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        img.save(buffer, format="PNG")
+    else:
+        img.convert("RGB").save(buffer, format=image_format, quality=quality)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/{image_format.lower()};base64,{encoded}"
+
+
+def vision_dpi(page_rect, provider):
+    """DPI at which a page fills, but doesn't exceed, the provider's vision limits"""
+    longest, shortest = VISION_LIMITS.get(provider, VISION_LIMITS["OpenAI"])
+    # Page sizes are in points, 72 to the inch
+    scale = min(
+        longest / max(page_rect.width, page_rect.height),
+        shortest / min(page_rect.width, page_rect.height)
+    )
+    return max(1, int(DEFAULT_DPI * scale))
+
+
+def _table_markdown(table):
+    try:
+        return table.to_markdown()
+    except AttributeError:
+        # Older PyMuPDF without to_markdown
+        rows = table.extract()
+        return "\n".join(" | ".join(cell or "" for cell in row) for row in rows)
+
+
+def extract_text_layer(page):
+    """
+    Text, tables and a text-or-graphics verdict for a PDF page. Word boxes
+    and image/drawing areas decide whether the slide can be analyzed from
+    its text alone.
+    """
+    page_area = abs(page.rect) or 1.0
+    words = page.get_text("words")
+
+    image_area = 0.0
+    for info in page.get_image_info():
+        image_area += abs(fitz.Rect(info["bbox"]) & page.rect)
+
+    try:
+        tables = page.find_tables().tables
+    except AttributeError:
+        # find_tables needs PyMuPDF 1.23+
+        tables = []
+    table_rects = [fitz.Rect(table.bbox) for table in tables]
+
+    # Lines and fills that make up table grids don't count as graphics
+    drawings = sum(
+        1 for drawing in page.get_drawings()
+        if not any(rect.contains(drawing["rect"]) for rect in table_rects)
+    )
+
+    text_dominant = (
+        len(words) >= TEXT_MIN_WORDS and
+        image_area / page_area <= TEXT_MAX_IMAGE_COVERAGE and
+        drawings <= TEXT_MAX_DRAWINGS
+    )
+    return {
+        "text": page.get_text("text", sort=True).strip(),
+        "tables": [_table_markdown(table) for table in tables],
+        "words": len(words),
+        "text_dominant": text_dominant,
+    }
+
+
+def use_text_layer(layer, mode):
+    """
+    Whether a slide is analyzed from its text layer. hybrid uses it for
+    text-heavy slides, text for any slide with words, vision never.
+    """
+    if mode == "vision" or layer is None:
+        return False
+    return layer['text_dominant'] or (mode == "text" and layer['words'] > 0)
+
+
+_worker_documents = OrderedDict()  # path -> fitz document, per worker process
+
+
+def prepare_page(path, page_number, provider, mode, image_format, quality):
+    """
+    Text layer and, when the slide needs the image, the encoded vision
+    payload of one page. Runs in a batch worker process, which keeps the
+    last few decks open.
+    """
+    document = _worker_documents.get(path)
+    if document is not None:
+        _worker_documents.move_to_end(path)
+    else:
+        document = fitz.open(path)
+        _worker_documents[path] = document
+        while len(_worker_documents) > 2:
+            _worker_documents.popitem(last=False)[1].close()
+    page = document[page_number]
+
+    layer = extract_text_layer(page) if mode != "vision" else None
+    if use_text_layer(layer, mode):
+        return layer, None, None
+    dpi = vision_dpi(page.rect, provider)
+    img = rasterize_page(document, page_number, dpi, max_height=10_000)
+    return layer, dpi, encode_image(img, image_format, quality)
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Process pool for batch slide preparation, spawned like the parse pool"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None or getattr(_render_pool, "_broken", False):
+            _render_pool = ProcessPoolExecutor(
+                max_workers=BATCH_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_pool
+
+
+class PageRenderCache:
+    """
+    Rendered slide images keyed by (PDF hash, page, DPI, max height), held
+    in an LRU bounded by decoded image size. After each lookup the
+    neighbouring pages are rendered in a background thread, so paging
+    through a deck only pays for rasterization on the first jump. Encoded
+    vision payloads and extracted text layers are cached alongside.
+    """
+
+    def __init__(self, max_bytes=PAGE_CACHE_MAX_BYTES, prefetch=PAGE_PREFETCH):
+        self.max_bytes = max_bytes
+        self.prefetch_pages = prefetch
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> PIL image
+        self._size = 0
+        self._pending = {}  # key -> Future of a queued or running render
+        self._documents = OrderedDict()  # pdf hash -> fitz document
+        self._payloads = OrderedDict()  # (pdf hash, page, dpi, format, quality) -> data URL
+        self._payload_size = 0
+        self._text_layers = OrderedDict()  # (pdf hash, page) -> extract_text_layer result
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-prefetch")
+
+    def _document(self, doc_hash, pdf_bytes):
+        """Open document for a hash, only called with _render_lock held"""
+        document = self._documents.get(doc_hash)
+        if document is None:
+            document = fitz.open(stream=pdf_bytes, filetype="pdf")
+            self._documents[doc_hash] = document
+            # Keep a couple of decks open, older ones only live in the cache
+            while len(self._documents) > 2:
+                self._documents.popitem(last=False)[1].close()
+        else:
+            self._documents.move_to_end(doc_hash)
+        return document
+
+    def _render(self, key, pdf_bytes):
+        doc_hash, page_number, dpi, max_height = key
+        with _render_lock:
+            img = rasterize_page(self._document(doc_hash, pdf_bytes), page_number, dpi, max_height)
+        self._put(key, img)
+        return img
+
+    def _put(self, key, img):
+        with self._lock:
+            self._pending.pop(key, None)
+            if key in self._entries:
+                return
+            self._entries[key] = img
+            self._size += img.width * img.height * len(img.getbands())
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.width * evicted.height * len(evicted.getbands())
+
+    def get(self, doc_hash, pdf_bytes, page_number, dpi=DEFAULT_DPI, max_height=800, prefetch=True):
+        """Rendered page image, from the cache when possible"""
+        key = (doc_hash, page_number, dpi, max_height)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            future = self._pending.get(key)
+
+        if img is None:
+            # Wait for an in-flight prefetch rather than rendering twice
+            img = future.result() if future is not None and not future.cancel() else self._render(key, pdf_bytes)
+        if prefetch:
+            self.prefetch(doc_hash, pdf_bytes, page_number, dpi, max_height)
+        return img
+
+    def prefetch(self, doc_hash, pdf_bytes, page_number, dpi=DEFAULT_DPI, max_height=800):
+        """Queue background renders for the pages around page_number"""
+        with _render_lock:
+            page_count = self._document(doc_hash, pdf_bytes).page_count
+        pages = [page_number + i for i in range(1, self.prefetch_pages + 1)] + [page_number - 1]
+        wanted = {
+            (doc_hash, p, dpi, max_height) for p in pages if 0 <= p < page_count
+        }
+
+        with self._lock:
+            # Drop queued renders for pages the user has moved away from
+            for key, future in list(self._pending.items()):
+                if key not in wanted and future.cancel():
+                    del self._pending[key]
+            for key in sorted(wanted, key=lambda k: abs(k[1] - page_number)):
+                if key in self._entries or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._render, key, pdf_bytes)
+
+    def encoded(self, doc_hash, pdf_bytes, page_number, provider,
+                image_format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY):
+        """
+        Page as a data URL sized for the provider's vision input, encoded
+        once per (document, page, resolution, format, quality)
+        """
+        with _render_lock:
+            page_rect = self._document(doc_hash, pdf_bytes)[page_number].rect
+        dpi = vision_dpi(page_rect, provider)
+        key = (doc_hash, page_number, dpi, image_format, quality)
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+
+        # Rendered straight from the PDF at the target resolution, the display
+        # image is too small for fine print and isn't worth keeping in the LRU
+        with _render_lock:
+            img = rasterize_page(self._document(doc_hash, pdf_bytes), page_number, dpi, max_height=10_000)
+        payload = encode_image(img, image_format, quality)
+
+        with self._lock:
+            if key not in self._payloads:
+                self._payloads[key] = payload
+                self._payload_size += len(payload)
+                while self._payload_size > PAYLOAD_CACHE_MAX_BYTES and len(self._payloads) > 1:
+                    _, evicted = self._payloads.popitem(last=False)
+                    self._payload_size -= len(evicted)
+        return payload
+
+    def text_layer(self, doc_hash, pdf_bytes, page_number):
+        """Cached extract_text_layer for a page"""
+        key = (doc_hash, page_number)
+        with self._lock:
+            layer = self._text_layers.get(key)
+            if layer is not None:
+                self._text_layers.move_to_end(key)
+                return layer
+
+        with _render_lock:
+            layer = extract_text_layer(self._document(doc_hash, pdf_bytes)[page_number])
+
+        with self._lock:
+            self._text_layers[key] = layer
+            while len(self._text_layers) > 2000:
+                self._text_layers.popitem(last=False)
+        return layer
+
+    def _deck_path(self, doc_hash, pdf_bytes):
+        """The deck on disk, written once per hash for batch workers"""
+        path = DECK_PATH / f"{doc_hash}.pdf"
+        if not path.exists():
+            DECK_PATH.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(pdf_bytes)
+            tmp_path.replace(path)
+        return str(path)
+
+    def _store_prepared(self, doc_hash, page_number, layer, dpi, payload,
+                        image_format, quality):
+        with self._lock:
+            if layer is not None:
+                self._text_layers[(doc_hash, page_number)] = layer
+                while len(self._text_layers) > 2000:
+                    self._text_layers.popitem(last=False)
+            key = (doc_hash, page_number, dpi, image_format, quality)
+            if payload is not None and key not in self._payloads:
+                self._payloads[key] = payload
+                self._payload_size += len(payload)
+                while self._payload_size > PAYLOAD_CACHE_MAX_BYTES and len(self._payloads) > 1:
+                    _, evicted = self._payloads.popitem(last=False)
+                    self._payload_size -= len(evicted)
+
+    def prepare_batch(self, doc_hash, pdf_bytes, pages, provider, mode,
+                      image_format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY):
+        """
+        Futures of (text layer, vision payload or None) keyed to their page.
+        Pages are prepared in parallel in worker processes, each opening the
+        deck itself, so a batch neither serializes on nor holds the render
+        lock. Results are cached like single-page lookups.
+        """
+        path = self._deck_path(doc_hash, pdf_bytes)
+        pool = get_render_pool()
+        futures = {}
+        for page_number in pages:
+            with self._lock:
+                layer = self._text_layers.get((doc_hash, page_number))
+            if use_text_layer(layer, mode):
+                future = Future()
+                future.set_result((layer, None))
+                futures[future] = page_number
+                continue
+            worker = pool.submit(prepare_page, path, page_number, provider, mode, image_format, quality)
+            future = Future()
+
+            def done(worker, future=future, page_number=page_number):
+                try:
+                    layer, dpi, payload = worker.result()
+                except Exception as e:
+                    future.set_exception(e)
+                    return
+                self._store_prepared(doc_hash, page_number, layer, dpi, payload, image_format, quality)
+                future.set_result((layer, payload))
+
+            worker.add_done_callback(done)
+            futures[future] = page_number
+        return futures
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "payloads": len(self._payloads),
+                "payload_bytes": self._payload_size,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageRenderCache()
+        return _cache
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", 256)) * 1024 * 1024
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))
+
+DATA_URL_PATTERN = re.compile(r"data:image/[a-z]+;base64,[A-Za-z0-9+/=]+")
+
+
+def _hash_images(value):
+    """Replace inline base64 images with their digest to keep keys small"""
+    if isinstance(value, str):
+        return DATA_URL_PATTERN.sub(
+            lambda m: "image-sha256:" + hashlib.sha256(m.group(0).encode()).hexdigest(),
+            value
+        )
+    if isinstance(value, list):
+        return [_hash_images(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _hash_images(v) for k, v in value.items()}
+    return value
+
+
+def make_key(provider, model, messages, temperature, **params):
+    """Cache key over the full request, images included by digest"""
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "messages": _hash_images(messages),
+            "temperature": temperature,
+            "params": params,
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Durable LLM response cache in SQLite, shared by every worker process
+    on the host and kept across restarts. Entries have their own TTL and
+    the least recently used ones are evicted past max_bytes.
+
+    The total size is kept in a meta row maintained by triggers, so a write
+    never has to scan the table. Expired entries are swept periodically,
+    and eviction removes least recently used entries in batches until the
+    cache is back under 90% of max_bytes.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL,
+                 sweep_interval=300, evict_batch=100):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.sweep_interval = sweep_interval
+        self.evict_batch = evict_batch
+        self.hits = 0
+        self.misses = 0
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Seeded once from the table, then kept current by the triggers
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (name, value) "
+                "SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                "UPDATE meta SET value = value + NEW.size WHERE name = 'bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                "UPDATE meta SET value = value - OLD.size WHERE name = 'bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN "
+                "UPDATE meta SET value = value - OLD.size + NEW.size WHERE name = 'bytes'; END"
+            )
+
+    def _connect(self):
+        # sqlite connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        with conn:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        data = json.dumps(value)
+        expires = now + (ttl if ttl is not None else self.default_ttl)
+        conn = self._connect()
+        with conn:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete
+            # would skip the size trigger
+            conn.execute(
+                "INSERT INTO entries (key, value, size, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, "
+                "expires = excluded.expires, last_access = excluded.last_access",
+                (key, data, len(data), expires, now)
+            )
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            with conn:
+                conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        if self._total_bytes(conn) > self.max_bytes:
+            self._evict(conn)
+
+    @staticmethod
+    def _total_bytes(conn):
+        row = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()
+        return row[0] if row else 0
+
+    def _evict(self, conn):
+        """Drop least recently used entries in batches until under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        while self._total_bytes(conn) > target:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                    (self.evict_batch,)
+                ).rowcount
+            if not deleted:
+                break
+
+    def stats(self):
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        size = self._total_bytes(conn)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
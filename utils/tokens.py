@@ -0,0 +1,25 @@
+import threading
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """cl100k_base, loaded on first use; False when tiktoken is unavailable"""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                # Missing package or no network to fetch the BPE file
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if not encoding:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
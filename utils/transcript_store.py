@@ -0,0 +1,145 @@
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+TRANSCRIPT_PATH = Path("data/transcripts")
+
+YOUTUBE_ID_PATTERN = re.compile(r"(?:youtu\.be/|youtube\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/))([A-Za-z0-9_-]{11})")
+
+
+def youtube_id(text):
+    """Video id from the first YouTube URL in text, if any"""
+    match = YOUTUBE_ID_PATTERN.search(text or "")
+    return match.group(1) if match else None
+
+
+class TranscriptStore:
+    """
+    Persistent store of YouTube and podcast transcripts, chunked and
+    embedded once per video or episode id. Questions are answered from the
+    top-k chunks instead of putting the whole transcript in the context.
+    Each source is a directory holding its chunks (JSON) and vectors (.npy).
+    """
+
+    def __init__(self, path, embeddings, chunk_size=1500, chunk_overlap=200):
+        self.path = Path(path)
+        self.embeddings = embeddings
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        self._sources = {}  # source id -> {"meta": dict, "chunks": [str], "vectors": ndarray}
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _safe_id(source_id):
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", source_id)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _load(self):
+        for source_dir in self.path.iterdir():
+            meta_path = source_dir / "chunks.json"
+            vectors_path = source_dir / "vectors.npy"
+            if not (meta_path.exists() and vectors_path.exists()):
+                continue
+            with open(meta_path, 'r') as f:
+                data = json.load(f)
+            self._sources[data["meta"]["id"]] = {
+                "meta": data["meta"],
+                "chunks": data["chunks"],
+                "vectors": np.load(vectors_path),
+            }
+
+    def has(self, source_id):
+        with self._lock:
+            return source_id in self._sources
+
+    def meta(self, source_id):
+        with self._lock:
+            source = self._sources.get(source_id)
+            return source["meta"] if source else None
+
+    def sources(self):
+        """Metadata of every stored transcript, newest first"""
+        with self._lock:
+            metas = [source["meta"] for source in self._sources.values()]
+        return sorted(metas, key=lambda m: m["added"], reverse=True)
+
+    def add(self, source_id, text, title=None, kind="youtube"):
+        """Chunk and embed a transcript, a no-op when the id is already stored"""
+        meta = self.meta(source_id)
+        if meta is not None:
+            return meta
+
+        chunks = self.text_splitter.split_text(text)
+        if not chunks:
+            raise ValueError(f"Transcript {source_id} is empty")
+        vectors = self._normalize(self.embeddings.embed_documents(chunks))
+        meta = {
+            "id": source_id,
+            "title": title or source_id,
+            "kind": kind,
+            "chunks": len(chunks),
+            "characters": len(text),
+            "added": time.time(),
+        }
+
+        # Write vectors before the chunk file, a source only counts as
+        # stored once chunks.json exists
+        source_dir = self.path / self._safe_id(source_id)
+        source_dir.mkdir(parents=True, exist_ok=True)
+        np.save(source_dir / "vectors.npy", vectors)
+        tmp_path = source_dir / "chunks.json.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"meta": meta, "chunks": chunks}, f)
+        tmp_path.replace(source_dir / "chunks.json")
+
+        with self._lock:
+            self._sources[source_id] = {"meta": meta, "chunks": chunks, "vectors": vectors}
+        return meta
+
+    def search(self, query, source_ids=None, k=6):
+        """Top-k (score, source meta, chunk index, text) across the given sources"""
+        with self._lock:
+            sources = [
+                source for source_id, source in self._sources.items()
+                if not source_ids or source_id in source_ids
+            ]
+        if not sources:
+            return []
+
+        vector = self._normalize(self.embeddings.embed_query(query))
+        hits = []
+        for source in sources:
+            scores = source["vectors"] @ vector
+            for i in np.argsort(-scores)[:k]:
+                hits.append((float(scores[i]), source["meta"], int(i), source["chunks"][i]))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        # Return the winners in transcript order so the excerpts read naturally
+        return sorted(hits[:k], key=lambda hit: (hit[1]["id"], hit[2]))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            # Imported here so agents only load the embedding stack on first use
+            from utils.embeddings import get_cached_embeddings
+            _store = TranscriptStore(TRANSCRIPT_PATH, get_cached_embeddings(TRANSCRIPT_PATH / "embedding_cache"))
+        return _store
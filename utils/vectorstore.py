@@ -0,0 +1,676 @@
+import argparse
+import hashlib
+import json
+import math
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, List
+
+try:
+    import fcntl
+except ImportError:  # Windows, locks only cover threads of one process
+    fcntl = None
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.retrievers import BaseRetriever
+
+from utils.keyword_index import BM25Index, reciprocal_rank_fusion
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def index_kind(index):
+    """Which of INDEX_TYPES a faiss index is"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+
+def reconstruct_all(index):
+    """All stored vectors in id order (approximate for PQ-compressed indexes)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_index(index_type, vectors):
+    """Create, train if needed and fill a faiss index of the given type"""
+    n, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.index_factory(dim, "HNSW32")
+    else:
+        nlist = max(1, int(math.sqrt(n)))
+        if index_type == "ivf_flat":
+            index = faiss.index_factory(dim, f"IVF{nlist},Flat")
+        else:
+            # Largest sub-quantizer count that divides the dimension
+            m = next(m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}")
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+class FileLock:
+    """
+    Exclusive lock shared by the threads of this process (re-entrant) and by
+    other processes through flock on a lock file, so several Streamlit
+    workers can share one index directory.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+class VectorStoreManager:
+    """
+    Keeps the policy FAISS index on disk as a merged base index plus
+    append-only segments. Each upload batch is written once as a new segment
+    and recorded in segments.log; a background thread folds pending segments
+    into the base index once enough have accumulated, so uploads never
+    rewrite the whole index.
+
+    Writers take inter-process file locks, so several worker processes can
+    share the directory. One manager is shared by every session in the
+    process. It holds the loaded index and document metadata in memory and
+    only reloads them when the files on disk change (e.g. another worker
+    uploaded documents). Pending segments are searched as separate layers
+    next to the base and their results merged by distance, so an upload
+    only loads its own segment. Loaded indexes are never modified in
+    place, so searches need no lock.
+
+    Alongside the index it keeps an inverted map from filename to FAISS ids,
+    so queries scoped to a few documents search only their vectors.
+
+    A BM25 keyword index over the same chunks lives next to it, so exact
+    clause numbers and acronyms can be fused with vector results.
+
+    The base index can be flat, IVF-Flat, HNSW or IVF-PQ. Segments are always
+    flat; IVF types stay flat until train_threshold vectors exist and are
+    trained during a background merge. An IVF-PQ base keeps its original
+    vectors in a sidecar file so retraining never re-quantizes its own
+    codes. nprobe and ef_search trade recall for latency at query time.
+    """
+
+    def __init__(self, base_path, embeddings, merge_threshold=8, merge_ratio=0.25, mmap=True,
+                 index_type="flat", train_threshold=10_000, nprobe=16, ef_search=64):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        self.base_path = Path(base_path)
+        self.vectorstore_path = self.base_path / "vectorstore"
+        self.metadata_path = self.base_path / "document_metadata.json"
+        self.segments_path = self.base_path / "segments"
+        self.segments_log = self.base_path / "segments.log"
+        self.keyword_path = self.base_path / "keyword_index.jsonl"
+        self.manifest_name = "merged_segments.json"
+        # Original float vectors of an IVF-PQ base, which can't be recovered
+        # from its compressed codes
+        self.vectors_name = "vectors.npy"
+        self.embeddings = embeddings
+        # Merge once this many segments are pending, or once they hold this
+        # share of the base index, so small uploads don't each rewrite it
+        self.merge_threshold = merge_threshold
+        self.merge_ratio = merge_ratio
+        self.mmap = mmap
+        self.index_type = index_type
+        self.train_threshold = train_threshold
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        # Inter-process: the log lock covers segments.log, the metadata and
+        # keyword files; the merge lock covers rewriting the base index
+        self._log_lock = FileLock(self.base_path / "segments.lock")
+        self._merge_lock = FileLock(self.base_path / "merge.lock")
+        self._merge_thread = None
+
+        # Shared in-memory state, guarded by lock
+        self.lock = threading.RLock()
+        # Layers searched together: the base index, then each pending
+        # segment, as (vectorstore, filename -> ids) pairs. The tuple is
+        # swapped as a whole so readers always see a consistent set
+        self._snapshot = ()
+        self.keyword_index = BM25Index(self.keyword_path)
+        self._documents = {}
+        self._version = None
+
+        self.segments_path.mkdir(parents=True, exist_ok=True)
+
+    def _disk_version(self):
+        """Cheap fingerprint of the persisted index, log and metadata"""
+        version = []
+        paths = (
+            self.vectorstore_path / "index.faiss",
+            self.segments_log,
+            self.metadata_path,
+            self.keyword_path,
+        )
+        for path in paths:
+            try:
+                stat = path.stat()
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def _refresh(self):
+        """Reload shared state if the on-disk version changed"""
+        version = self._disk_version()
+        if version == self._version:
+            return
+        with self.lock:
+            if version == self._version:
+                return
+            self._documents = self._load_metadata()
+            self._set_layers(self.load())
+            self.keyword_index = self._load_keyword_index(self._snapshot)
+            self._version = self._disk_version()
+
+    def _load_keyword_index(self, layers):
+        keyword_index = BM25Index.load(self.keyword_path)
+        if len(keyword_index) == 0:
+            # Backfill indexes created before keyword search existed
+            for vectorstore, _ in layers:
+                keyword_index.add(self._keyword_chunks(vectorstore, vectorstore.index_to_docstore_id.values()))
+        return keyword_index
+
+    def _keyword_chunks(self, vectorstore, docstore_ids):
+        chunks = []
+        for docstore_id in docstore_ids:
+            doc = vectorstore.docstore.search(docstore_id)
+            chunks.append((docstore_id, doc.page_content, self._filename_for(doc.metadata)))
+        return chunks
+
+    def _set_layers(self, vectorstores):
+        self._snapshot = tuple((vs, self._build_doc_ids(vs)) for vs in vectorstores)
+
+    def _filename_for(self, metadata):
+        """Filename a chunk belongs to"""
+        if 'filename' in metadata:
+            return metadata['filename']
+        # Chunks stored before filenames were recorded only carry the temp
+        # file path, which ends with the uploaded filename
+        source = metadata.get('source', '')
+        matches = [name for name in self._documents if source.endswith(name)]
+        return max(matches, key=len) if matches else None
+
+    def _build_doc_ids(self, vectorstore):
+        """Inverted index of filename -> sorted FAISS ids of its chunks"""
+        if vectorstore is None:
+            return {}
+        doc_ids = {}
+        for i, docstore_id in vectorstore.index_to_docstore_id.items():
+            doc = vectorstore.docstore.search(docstore_id)
+            filename = self._filename_for(getattr(doc, 'metadata', {}))
+            doc_ids.setdefault(filename, []).append(i)
+        return {name: np.array(sorted(ids), dtype='int64') for name, ids in doc_ids.items()}
+
+    def get_vectorstore(self):
+        """The base index, or the oldest pending segment before the first merge"""
+        self._refresh()
+        layers = self._snapshot
+        return layers[0][0] if layers else None
+
+    def get_documents(self):
+        """Metadata for every stored document, keyed by filename"""
+        self._refresh()
+        return dict(self._documents)
+
+    def fingerprint(self, filenames):
+        """
+        Changes whenever the content of any of the given documents or the
+        index type changes. Keyed on content hashes rather than filenames, so
+        a file stored again with different content gets a new fingerprint.
+        """
+        self._refresh()
+        hashes = []
+        for name in sorted(filenames):
+            entry = self._documents.get(name) or {}
+            # Documents stored before content hashes were recorded
+            hashes.append(entry.get('content_hash') or [name, entry])
+        payload = json.dumps([hashes, self.index_type], sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _content_hash(docs):
+        """Digest of a document's chunks, text and metadata"""
+        digest = hashlib.sha256()
+        for doc in docs:
+            digest.update(json.dumps([doc.page_content, doc.metadata], sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _load_metadata(self):
+        if not self.metadata_path.exists():
+            return {}
+        with open(self.metadata_path, 'r') as f:
+            return json.load(f)
+
+    def _save_metadata(self):
+        tmp_path = self.metadata_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self._documents, f)
+        tmp_path.replace(self.metadata_path)
+
+    def _read_log(self):
+        """Return pending segment entries in the order they were written"""
+        if not self.segments_log.exists():
+            return []
+        with open(self.segments_log, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _merged_segments(self, path):
+        """Names of segments already folded into the index stored at path"""
+        manifest = Path(path) / self.manifest_name
+        if not manifest.exists():
+            return set()
+        with open(manifest, 'r') as f:
+            return set(json.load(f))
+
+    def _configure(self, index):
+        """Apply the recall/latency knobs to a loaded index"""
+        kind = index_kind(index)
+        if kind == "hnsw":
+            index.hnsw.efSearch = self.ef_search
+        elif kind != "flat":
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        return index
+
+    def _load_index(self, path, mmap=False):
+        if not mmap:
+            vectorstore = FAISS.load_local(
+                str(path),
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+            self._configure(vectorstore.index)
+            return vectorstore
+
+        # Same layout as FAISS.save_local, but let faiss map the index file
+        # instead of copying it onto the heap
+        with open(Path(path) / "index.pkl", 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        try:
+            index = faiss.read_index(
+                str(Path(path) / "index.faiss"),
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError:
+            index = faiss.read_index(str(Path(path) / "index.faiss"))
+        return FAISS(self.embeddings, self._configure(index), docstore, index_to_docstore_id)
+
+    @staticmethod
+    def _append(base, segment):
+        """
+        Add a flat segment to a base index of any type. Unlike
+        FAISS.merge_from this works when the base is IVF or HNSW.
+        """
+        start = base.index.ntotal
+        base.index.add(reconstruct_all(segment.index))
+        documents = {}
+        for i, docstore_id in segment.index_to_docstore_id.items():
+            base.index_to_docstore_id[start + i] = docstore_id
+            documents[docstore_id] = segment.docstore.search(docstore_id)
+        base.docstore.add(documents)
+
+    @staticmethod
+    def _outgrown(index, growth=4):
+        """
+        True once an IVF index holds growth times the vectors its nlist was
+        sized for (nlist = sqrt(n) at training), so its lists are too long
+        """
+        if index_kind(index) not in ("ivf_flat", "ivf_pq"):
+            return False
+        nlist = faiss.extract_index_ivf(index).nlist
+        return index.ntotal >= growth * nlist * nlist
+
+    def _load_originals(self, path):
+        """Original vectors stored next to an IVF-PQ base, None if it predates the sidecar"""
+        try:
+            return np.load(Path(path) / self.vectors_name)
+        except FileNotFoundError:
+            return None
+
+    def _target_type(self, num_vectors):
+        """Index type to use for a base index of the given size"""
+        if self.index_type in ("ivf_flat", "ivf_pq") and num_vectors < self.train_threshold:
+            return "flat"
+        return self.index_type
+
+    def load(self):
+        """Load the base index and each segment that is not merged into it yet"""
+        layers = []
+        merged = set()
+        if self.vectorstore_path.exists():
+            merged = self._merged_segments(self.vectorstore_path)
+            # Never modified once loaded, so it can always be mapped
+            layers.append(self._load_index(self.vectorstore_path, mmap=self.mmap))
+        for entry in self._read_log():
+            if entry["segment"] not in merged:
+                layers.append(self._load_index(self.segments_path / entry["segment"]))
+        return layers
+
+    def add_documents(self, docs_by_file, vectors_by_file=None):
+        """
+        Persist a whole upload batch (split documents keyed by filename) as a
+        single segment and merge it into the shared index. Vectors already
+        computed by the ingestion pipeline are reused, otherwise the batch is
+        embedded in one call.
+        """
+        documents = [doc for docs in docs_by_file.values() for doc in docs]
+        if not documents:
+            return
+
+        self._refresh()
+        if vectors_by_file is None:
+            segment = FAISS.from_documents(documents, self.embeddings)
+        else:
+            vectors = [v for name in docs_by_file for v in vectors_by_file[name]]
+            segment = FAISS.from_embeddings(
+                [(doc.page_content, v) for doc, v in zip(documents, vectors)],
+                self.embeddings,
+                metadatas=[doc.metadata for doc in documents]
+            )
+        name = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        segment.save_local(str(self.segments_path / name))
+
+        entry = {
+            "segment": name,
+            "num_chunks": len(documents),
+            "files": list(docs_by_file.keys()),
+            "created": time.time(),
+        }
+        with self.lock:
+            # Another worker wrote to the index since the last refresh
+            stale = self._disk_version() != self._version
+            with self._log_lock:
+                with open(self.segments_log, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+
+                # Merge into the metadata on disk, other workers may have
+                # added documents since it was loaded here
+                documents = self._load_metadata()
+                for filename, docs in docs_by_file.items():
+                    documents[filename] = {
+                        'filename': filename,
+                        'num_chunks': len(docs),
+                        'segment': name,
+                        'content_hash': self._content_hash(docs)
+                    }
+                self._documents = documents
+                self._save_metadata()
+                self.keyword_index.add(
+                    self._keyword_chunks(segment, segment.index_to_docstore_id.values())
+                )
+
+            # Add the segment as one more layer, only reloading from disk
+            # when the snapshot is out of date anyway
+            if stale:
+                self._set_layers(self.load())
+            else:
+                self._snapshot = self._snapshot + ((segment, self._build_doc_ids(segment)),)
+            self._version = self._disk_version()
+
+        if self._should_merge():
+            self.schedule_merge()
+
+    def _should_merge(self):
+        pending = self._read_log()
+        if len(pending) >= self.merge_threshold:
+            return True
+        pending_chunks = sum(entry["num_chunks"] for entry in pending)
+        total = max(pending_chunks, sum(vs.index.ntotal for vs, _ in self._snapshot))
+        return pending_chunks >= self.merge_ratio * (total - pending_chunks)
+
+    def _selector(self, doc_ids, filenames):
+        """FAISS id selector covering the chunks of the given files"""
+        ids = [doc_ids[name] for name in filenames if name in doc_ids]
+        if not ids:
+            return None
+        ids = np.unique(np.concatenate(ids))
+        # Files from one upload batch sit in one contiguous id range
+        if ids[-1] - ids[0] + 1 == len(ids):
+            return faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+        return faiss.IDSelectorBatch(ids)
+
+    def _layer_search(self, vectorstore, doc_ids, embedding, k, filenames):
+        """(distance, docstore id) of the k nearest chunks in one layer"""
+        params = None
+        if filenames is not None and not set(filenames) >= set(doc_ids):
+            selector = self._selector(doc_ids, filenames)
+            if selector is None:
+                return []
+            kind = index_kind(vectorstore.index)
+            if kind == "hnsw":
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+            elif kind != "flat":
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+
+        if vectorstore._normalize_L2:
+            embedding = embedding.copy()
+            faiss.normalize_L2(embedding)
+        distances, indices = vectorstore.index.search(embedding, k, params=params)
+        return [
+            (float(distance), vectorstore.index_to_docstore_id[i])
+            for distance, i in zip(distances[0], indices[0]) if i != -1
+        ]
+
+    def _vector_search(self, layers, query, k, filenames):
+        """Docstore ids of the k nearest chunks across layers, optionally limited to files"""
+        embedding = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+        hits = []
+        for vectorstore, doc_ids in layers:
+            hits.extend(self._layer_search(vectorstore, doc_ids, embedding, k, filenames))
+        # Every layer uses L2 distance, so results compare directly
+        hits.sort(key=lambda hit: hit[0])
+        return [docstore_id for _, docstore_id in hits[:k]]
+
+    @staticmethod
+    def _lookup(layers, docstore_id):
+        for vectorstore, _ in layers:
+            doc = vectorstore.docstore.search(docstore_id)
+            # The docstore returns a message string for unknown ids
+            if not isinstance(doc, str):
+                return doc
+        return None
+
+    def similarity_search(self, query, k=4, filenames=None, hybrid=True):
+        """
+        Search the shared index, optionally limited to the given files. In
+        hybrid mode vector and BM25 results are fused by reciprocal rank.
+        """
+        self._refresh()
+        layers = self._snapshot
+        if not layers:
+            return []
+
+        if hybrid:
+            # Over-fetch from both rankers so fusion has something to reorder
+            vector_ids = self._vector_search(layers, query, k * 2, filenames)
+            keyword_ids = self.keyword_index.search(query, k * 2, filenames)
+            ids = reciprocal_rank_fusion([vector_ids, keyword_ids])[:k]
+        else:
+            ids = self._vector_search(layers, query, k, filenames)
+
+        documents = []
+        for docstore_id in ids:
+            doc = self._lookup(layers, docstore_id)
+            # The keyword index may briefly be ahead of this snapshot
+            if doc is not None:
+                documents.append(doc)
+        return documents
+
+    def schedule_merge(self):
+        """Start a background merge unless one is already running"""
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+        self._merge_thread = threading.Thread(target=self._merge_pending, daemon=True)
+        self._merge_thread.start()
+
+    def wait_for_merge(self, timeout=None):
+        if self._merge_thread is not None:
+            self._merge_thread.join(timeout)
+
+    def _merge_pending(self):
+        try:
+            self.merge_pending()
+        except Exception as e:
+            print(f"\nVectorstore merge failed: {str(e)}")
+
+    def merge_pending(self, rebuild=False):
+        """
+        Fold all pending segments into the base index and rewrite it once.
+        The base is rebuilt when its type no longer matches the configured
+        one, e.g. once an IVF index has enough vectors to be trained, when
+        an IVF index has grown 4x since it was trained, or always when
+        rebuild is set.
+        """
+        with self._merge_lock:
+            with self._log_lock:
+                pending = self._read_log()
+            if not pending and not rebuild:
+                return
+
+            base = None
+            merged = set()
+            # Only tracked for an IVF-PQ base, other types reconstruct exactly
+            originals = None
+            if self.vectorstore_path.exists():
+                base = self._load_index(self.vectorstore_path)
+                merged = self._merged_segments(self.vectorstore_path)
+                if index_kind(base.index) == "ivf_pq":
+                    originals = self._load_originals(self.vectorstore_path)
+
+            for entry in pending:
+                if entry["segment"] in merged:
+                    continue
+                segment = self._load_index(self.segments_path / entry["segment"])
+                if base is None:
+                    base = segment
+                else:
+                    if originals is not None:
+                        originals = np.vstack([originals, reconstruct_all(segment.index)])
+                    self._append(base, segment)
+                merged.add(entry["segment"])
+
+            if base is None:
+                return
+
+            target = self._target_type(base.index.ntotal)
+            compressed = index_kind(base.index) == "ivf_pq"
+            if rebuild or index_kind(base.index) != target or self._outgrown(base.index):
+                if compressed and originals is None:
+                    # Training on decoded PQ codes would compound the
+                    # quantization error with every retrain
+                    message = (
+                        "IVF-PQ vectorstore has no stored original vectors and can't be "
+                        "retrained; re-upload the documents to rebuild it"
+                    )
+                    if rebuild:
+                        raise ValueError(message)
+                    print(f"\n{message}")
+                else:
+                    vectors = originals if compressed else reconstruct_all(base.index)
+                    # Ids are added in the same order, so the docstore mapping holds
+                    print(f"Rebuilding vectorstore as {target} with {base.index.ntotal} vectors")
+                    base.index = self._configure(build_index(target, vectors))
+                    originals = vectors if target == "ivf_pq" else None
+
+            # Write the new base next to the old one and swap it in, recording
+            # which segments it contains so a crash mid-merge never applies a
+            # segment twice on the next load
+            tmp_path = self.base_path / "vectorstore.tmp"
+            old_path = self.base_path / "vectorstore.old"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            base.save_local(str(tmp_path))
+            with open(tmp_path / self.manifest_name, 'w') as f:
+                json.dump(sorted(merged), f)
+            if originals is not None:
+                np.save(tmp_path / self.vectors_name, originals)
+
+            shutil.rmtree(old_path, ignore_errors=True)
+            if self.vectorstore_path.exists():
+                self.vectorstore_path.rename(old_path)
+            tmp_path.rename(self.vectorstore_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+
+            with self._log_lock:
+                remaining = [e for e in self._read_log() if e["segment"] not in merged]
+                with open(self.segments_log, 'w') as f:
+                    for entry in remaining:
+                        f.write(json.dumps(entry) + "\n")
+
+            for name in merged:
+                shutil.rmtree(self.segments_path / name, ignore_errors=True)
+
+    def migrate(self):
+        """One-shot conversion of the stored index to the configured type"""
+        self.merge_pending(rebuild=True)
+
+
+class ScopedRetriever(BaseRetriever):
+    """Retriever over the shared index limited to the selected documents"""
+    manager: Any
+    filenames: List[str]
+    k: int = 4
+    hybrid: bool = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.manager.similarity_search(
+            query,
+            k=self.k,
+            filenames=self.filenames,
+            hybrid=self.hybrid
+        )
+
+
+if __name__ == "__main__":
+    # Convert an existing policy index, e.g.
+    #   python -m utils.vectorstore --index-type hnsw
+    from utils.embeddings import get_cached_embeddings
+
+    parser = argparse.ArgumentParser(description="Migrate the policy vectorstore to another index type")
+    parser.add_argument("--path", default="data/vectorstore")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, required=True)
+    parser.add_argument("--train-threshold", type=int, default=10_000)
+    args = parser.parse_args()
+
+    manager = VectorStoreManager(
+        args.path,
+        get_cached_embeddings(Path(args.path) / "embedding_cache"),
+        index_type=args.index_type,
+        train_threshold=args.train_threshold
+    )
+    manager.migrate()
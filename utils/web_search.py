@@ -0,0 +1,233 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from utils.clients import default_provider
+from utils.tokens import count_tokens
+
+SEARCH_CACHE_PATH = Path(os.getenv("WEB_SEARCH_CACHE_PATH", "data/search_cache.sqlite"))
+SEARCH_CACHE_TTL = int(os.getenv("WEB_SEARCH_CACHE_TTL", 6 * 3600))
+# Content-word overlap at which two queries count as the same search
+SEARCH_SIMILARITY = float(os.getenv("WEB_SEARCH_SIMILARITY", 0.8))
+# Budget for the results handed to the model, and per-result snippet length
+SEARCH_MAX_TOKENS = int(os.getenv("WEB_SEARCH_MAX_TOKENS", 1500))
+SEARCH_SNIPPET_CHARS = int(os.getenv("WEB_SEARCH_SNIPPET_CHARS", 500))
+
+# Interrogatives are kept, "who" and "when" questions about X are different searches
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "on", "in", "for",
+    "to", "and", "or", "about", "please", "me", "tell", "find", "search", "with",
+    "at", "by", "from", "do", "does", "did", "can", "you", "i", "it", "this", "that",
+}
+
+
+def query_tokens(query):
+    """Content words of a query, lowercased and crudely singularized"""
+    tokens = set()
+    for word in re.findall(r"[a-z0-9]+", query.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+def normalize_query(query):
+    """Exact cache key: the query's words in order, ignoring case and punctuation"""
+    words = re.findall(r"[a-z0-9]+", query.lower())
+    return " ".join(words) if words else query.strip().lower()
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def canonical_url(url):
+    """URL without scheme, www, query string, fragment or trailing slash"""
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host + parts.path.rstrip("/")
+
+
+def trim_results(response, max_tokens=SEARCH_MAX_TOKENS, snippet_chars=SEARCH_SNIPPET_CHARS):
+    """
+    Compact text rendering of a Tavily response for the model context:
+    best results first, duplicate URLs dropped, snippets clipped, and
+    stopped once the token budget is spent.
+    """
+    lines = []
+    used = 0
+    answer = response.get("answer")
+    if answer:
+        lines.append(f"Answer: {answer}")
+        used += count_tokens(lines[-1])
+
+    seen = set()
+    results = sorted(response.get("results", []), key=lambda r: r.get("score") or 0, reverse=True)
+    for result in results:
+        url = result.get("url", "")
+        if canonical_url(url) in seen:
+            continue
+        seen.add(canonical_url(url))
+
+        snippet = " ".join((result.get("content") or "").split())
+        if len(snippet) > snippet_chars:
+            snippet = snippet[:snippet_chars].rsplit(" ", 1)[0] + "..."
+        entry = f"[{len(seen)}] {result.get('title', '')} - {url}\n{snippet}"
+        tokens = count_tokens(entry)
+        if used + tokens > max_tokens:
+            break
+        lines.append(entry)
+        used += tokens
+    return "\n\n".join(lines) if lines else "No results found."
+
+
+class SearchCache:
+    """
+    Local SQLite cache of raw search responses keyed by normalized query.
+    A lookup that misses the exact key falls back to the most similar live
+    query by content-word overlap, so rephrasings of a question share one
+    search. Only keys are scanned, the winner's response is read afterwards.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL,
+                 similarity=SEARCH_SIMILARITY, max_entries=5000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "key TEXT PRIMARY KEY, query TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # sqlite connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, query):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM searches WHERE key = ? AND expires > ?",
+            (normalize_query(query), now)
+        ).fetchone()
+        if row is None and self.similarity < 1.0:
+            tokens = query_tokens(query)
+            best, best_score = None, self.similarity
+            for (key,) in conn.execute(
+                "SELECT key FROM searches WHERE expires > ?", (now,)
+            ):
+                score = _jaccard(tokens, query_tokens(key))
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is not None:
+                row = conn.execute(
+                    "SELECT value FROM searches WHERE key = ?", (best,)
+                ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, query, response):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, query, value, expires) VALUES (?, ?, ?, ?)",
+                (normalize_query(query), query, json.dumps(response), now + self.ttl)
+            )
+            conn.execute("DELETE FROM searches WHERE expires <= ?", (now,))
+            conn.execute(
+                "DELETE FROM searches WHERE key NOT IN "
+                "(SELECT key FROM searches ORDER BY expires DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+
+class WebSearch:
+    """
+    Search front end used by the agents: cached responses, one upstream
+    call for identical concurrent searches, and results trimmed to a token
+    budget before they reach the model.
+    """
+
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self._inflight = {}  # normalized query -> Future of the raw response
+        self._lock = threading.Lock()
+
+    def _fetch(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            response = self.client.search(query)
+            self.cache.set(query, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def search(self, query, max_tokens=SEARCH_MAX_TOKENS):
+        response = self.cache.get(query)
+        if response is None:
+            response = self._fetch(query)
+        return trim_results(response, max_tokens)
+
+
+def get_search_client():
+    """Tavily, or the offline stand-in with WEB_SEARCH_PROVIDER=local or the Local LLM provider"""
+    provider = os.getenv("WEB_SEARCH_PROVIDER", "local" if default_provider() == "Local" else "tavily")
+    if provider == "local":
+        from utils.local_search import LocalTavilyClient
+        return LocalTavilyClient()
+    from tavily import TavilyClient
+    return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+def get_web_search():
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = WebSearch(get_search_client(), SearchCache())
+        return _search